@@ -1,86 +1,541 @@
+import argparse
+import functools
+import glob
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import pandas as pd
-import scipy.stats as stats
-import matplotlib.pyplot as plt
-
-# Load data
-df = pd.read_csv('assignment6_CSV.csv')
-data = df['Value'].values
-
-# Initialize results storage
-results = []
-
-# Print data summary
-print(f"Data summary: Min={data.min():.3f}, Max={data.max():.3f}, Mean={data.mean():.3f}, Median={np.median(data):.3f}, Std={data.std():.3f}\n")
-
-# Define distributions to fit
-distributions = [
-    ('Uniform', stats.uniform, 2),
-    ('Exponential', stats.expon, 2),
-    ('Gamma', stats.gamma, 3),
-    ('Weibull', stats.weibull_min, 3),
-    ('Normal', stats.norm, 2)
-]
-
-# Fit each distribution and compute metrics
-for name, dist, k in distributions:
+
+import profiling
+from streaming_stats import StreamingStats
+
+''' Distribution fitting for a column of observations
+
+scipy.stats, pandas and matplotlib are imported by the functions that need
+them, so importing this module (e.g. in worker processes) stays cheap.
+Run as a script for the full report on assignment6_CSV.csv.
+
+'''
+
+# Default data file and column
+data_path = 'assignment6_CSV.csv'
+data_column = 'Value'
+
+# Parametric-bootstrap resamples for KS p-values (0 disables; gamma and
+# Weibull are refitted per resample, so this is the slow part)
+bootstrap_resamples = 0
+
+def default_distributions():
+    """
+    Candidate families as (name, scipy distribution, number of parameters).
+    """
+    import scipy.stats as stats
+    return [
+        ('Uniform', stats.uniform, 2),
+        ('Exponential', stats.expon, 2),
+        ('Gamma', stats.gamma, 3),
+        ('Weibull', stats.weibull_min, 3),
+        ('Normal', stats.norm, 2)
+    ]
+
+def load_data(path=data_path, column=data_column):
+    """Reads one column of a CSV file as a float array."""
+    import pandas as pd
+    return pd.read_csv(path)[column].to_numpy(dtype=float)
+
+# --- Fitting Engine ---
+def closed_form_params(dist_name, data):
+    """
+    Closed-form maximum likelihood estimates (same values as dist.fit) for
+    the families that have them; None for the others.
+    """
+    if dist_name == 'norm':
+        return (data.mean(), data.std())
+    if dist_name == 'expon':
+        loc = data.min()
+        return (loc, data.mean() - loc)
+    if dist_name == 'uniform':
+        loc = data.min()
+        return (loc, data.max() - loc)
+    return None
+
+def _below_min(data):
+    # A location just below the data minimum
+    return data.min() - 0.01 * (data.max() - data.min())
+
+def initial_guess(dist_name, data):
+    """
+    Warm start (shape, loc, scale) for the numerical MLE of gamma and Weibull,
+    from the method of moments; None if no good guess is available.
+    """
+    if dist_name == 'gamma':
+        import scipy.stats as stats
+        skewness = stats.skew(data)
+        if skewness <= 0:
+            return None
+        shape = 4 / skewness**2
+        scale = data.std() * skewness / 2
+        # Keep the location below the minimum so every point has positive density
+        loc = min(data.mean() - shape * scale, _below_min(data))
+        return (shape, loc, scale)
+    if dist_name == 'weibull_min':
+        # Location just below the minimum, then the Gumbel moments of log(x - loc)
+        loc = _below_min(data)
+        log_data = np.log(data - loc)
+        shape = 1.2825 / log_data.std()
+        scale = np.exp(log_data.mean() + 0.5772 / shape)
+        return (shape, loc, scale)
+    return None
+
+def warm_start_fit(dist, data):
+    """
+    Numerical MLE of dist, started from initial_guess when there is one.
+    If the warm-started fit's log-likelihood is not finite or is below the
+    guess's, the better of it and a plain dist.fit(data) is returned.
+    """
+    guess = initial_guess(dist.name, data)
+    if guess is None:
+        return dist.fit(data)
+    shape, loc, scale = guess
+    params = dist.fit(data, shape, loc=loc, scale=scale)
+    log_likelihood = np.sum(dist.logpdf(data, *params))
+    guess_log_likelihood = np.sum(dist.logpdf(data, *guess))
+    if np.isfinite(log_likelihood) and not log_likelihood < guess_log_likelihood:
+        return params
+    plain_params = dist.fit(data)
+    plain_log_likelihood = np.sum(dist.logpdf(data, *plain_params))
+    if not np.isfinite(log_likelihood) or plain_log_likelihood >= log_likelihood:
+        return plain_params
+    return params
+
+def fit_distribution(name, dist, k, data):
+    """
+    Fits one family and computes its KS statistic and AIC.
+
+    Returns:
+    - Dictionary with the same keys as the results table
+    """
+    params = closed_form_params(dist.name, data)
+    if params is None:
+        params = warm_start_fit(dist, data)
+    fitted_dist = dist(*params)
+    
+    # Kolmogorov-Smirnov test
+    import scipy.stats as stats
+    D, _ = stats.kstest(data, fitted_dist.cdf)
+    
+    # Log-likelihood and AIC
+    log_likelihood = np.sum(fitted_dist.logpdf(data))
+    aic = 2 * k - 2 * log_likelihood
+    
+    return {
+        'Distribution': name,
+        'Parameters': params,
+        'KS Statistic (D)': D,
+        'AIC': aic,
+        'Fitted_Dist': fitted_dist  # Store fitted object
+    }
+
+def _fit_distribution_task(args):
+    # Worker: fit one family, returning the error instead of raising
+    name, dist, k, data = args
     try:
-        # Fit distribution to data
-        params = dist.fit(data)
-        fitted_dist = dist(*params)
-        
-        # Kolmogorov-Smirnov test
-        D, _ = stats.kstest(data, fitted_dist.cdf)
-        
-        # Log-likelihood and AIC
-        log_likelihood = np.sum(fitted_dist.logpdf(data))
-        aic = 2 * k - 2 * log_likelihood
-        
-        results.append({
-            'Distribution': name,
+        return fit_distribution(name, dist, k, data)
+    except Exception as e:
+        return e
+
+def fit_distributions(data, distributions, max_workers=1):
+    """
+    Fits every candidate family to data.
+
+    Parameters:
+    - data: observed data
+    - distributions: list of (name, scipy distribution, number of parameters)
+    - max_workers: number of processes fitting families in parallel
+      (1 fits them in this process, None uses all cores)
+
+    Returns:
+    - List of result dictionaries, one per successfully fitted family
+    """
+    tasks = [(name, dist, k, data) for name, dist, k in distributions]
+    if max_workers == 1:
+        fits = [_fit_distribution_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            fits = list(executor.map(_fit_distribution_task, tasks))
+
+    fitted = []
+    for (name, _, _), fit in zip(distributions, fits):
+        if isinstance(fit, Exception):
+            print(f"Error fitting {name}: {str(fit)}")
+        else:
+            fitted.append(fit)
+    return fitted
+
+# --- Parametric Bootstrap KS p-values ---
+def closed_form_params_batch(dist_name, samples):
+    """
+    Row-wise closed_form_params for a 2D array of samples (one sample per
+    row); returns a tuple of parameter arrays, or None if the family has no
+    closed-form MLE.
+    """
+    if dist_name == 'norm':
+        return (samples.mean(axis=1), samples.std(axis=1))
+    if dist_name == 'expon':
+        loc = samples.min(axis=1)
+        return (loc, samples.mean(axis=1) - loc)
+    if dist_name == 'uniform':
+        loc = samples.min(axis=1)
+        return (loc, samples.max(axis=1) - loc)
+    return None
+
+def ks_statistic_batch(samples, dist, params):
+    """
+    KS statistic D of every row of samples against dist with row-wise
+    parameters (a tuple of arrays, one value per row).
+    """
+    n = samples.shape[1]
+    cdf = dist.cdf(np.sort(samples, axis=1), *[np.asarray(p)[:, None] for p in params])
+    i = np.arange(1, n + 1)
+    d_plus = (i / n - cdf).max(axis=1)
+    d_minus = (cdf - (i - 1) / n).max(axis=1)
+    return np.maximum(d_plus, d_minus)
+
+def _refit_rows(args):
+    # Worker: numerical refit of each bootstrap sample with the estimator
+    # used for the original data (warm_start_fit)
+    dist, samples = args
+    fits = [warm_start_fit(dist, row) for row in samples]
+    return np.array(fits).T
+
+def bootstrap_ks_pvalue(data, dist, params, n_boot=1000, rng=None, max_workers=1,
+                        chunk_elements=2**20):
+    """
+    Parametric-bootstrap p-value of the KS statistic when the parameters
+    were estimated from the same data (Lilliefors-type correction).
+
+    Resamples are drawn from the fitted distribution as (rows x n) blocks,
+    refitted (vectorized for closed-form families, otherwise with
+    warm_start_fit in parallel across max_workers processes) and their KS
+    statistics computed at once. A block holds about chunk_elements values
+    (at least one row), so memory does not grow with n_boot or n.
+
+    Returns:
+    - (p-value, observed D, array of bootstrap D values)
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    data = np.asarray(data, dtype=float)
+    n = len(data)
+    d_obs = ks_statistic_batch(data[None, :], dist, [np.array([p]) for p in params])[0]
+
+    d_boot = []
+    workers = max_workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        chunk_rows = max(1, chunk_elements // n)
+        for start in range(0, n_boot, chunk_rows):
+            rows = min(chunk_rows, n_boot - start)
+            samples = dist.rvs(*params, size=(rows, n), random_state=rng)
+
+            boot_params = closed_form_params_batch(dist.name, samples)
+            if boot_params is None:
+                if executor is None:
+                    boot_params = _refit_rows((dist, samples))
+                else:
+                    parts = np.array_split(samples, workers)
+                    tasks = [(dist, part) for part in parts if len(part)]
+                    boot_params = np.concatenate(list(executor.map(_refit_rows, tasks)), axis=1)
+            d_boot.append(ks_statistic_batch(samples, dist, boot_params))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    d_boot = np.concatenate(d_boot)
+    p_value = (1 + np.count_nonzero(d_boot >= d_obs)) / (n_boot + 1)
+    return p_value, d_obs, d_boot
+
+def add_bootstrap_pvalues(results, data, n_boot=1000, rng=None, max_workers=1):
+    """
+    Adds a 'KS p-value (bootstrap)' entry to each fitted result.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    for r in results:
+        fitted_dist = r['Fitted_Dist']
+        r['KS p-value (bootstrap)'], _, _ = bootstrap_ks_pvalue(
+            data, fitted_dist.dist, r['Parameters'], n_boot, rng, max_workers)
+    return results
+
+# --- Batch Fitting with Result Cache ---
+def data_hash(data):
+    """Content hash of a data column (float64 values)."""
+    values = np.ascontiguousarray(data, dtype=np.float64)
+    return hashlib.sha256(values.tobytes()).hexdigest()
+
+def _fit_cache_key(cache, data, distributions):
+    # Key of a column's fits: data hash, candidate families and the source
+    # of the fitting engine, so a changed fit is never served from the cache
+    from result_cache import code_version
+    spec = [(name, dist.name, k) for name, dist, k in distributions]
+    return cache.key("distfit.fit_distributions", {"data": data_hash(data), "distributions": spec},
+                     None, code_version(fit_distribution, warm_start_fit))
+
+def _get_cached_fits(cache, key, distributions):
+    # Cached fits with their distribution objects rebuilt, or None
+    cached = cache.get(key)
+    if cached is None:
+        return None
+    by_name = {name: (dist, k) for name, dist, k in distributions}
+    fitted = []
+    for row in cached:
+        dist, _ = by_name[row['Distribution']]
+        params = tuple(row['Parameters'])
+        fitted.append({
+            'Distribution': row['Distribution'],
             'Parameters': params,
-            'KS Statistic (D)': D,
-            'AIC': aic,
-            'Fitted_Dist': fitted_dist  # Store fitted object
+            'KS Statistic (D)': row['KS Statistic (D)'],
+            'AIC': row['AIC'],
+            'Fitted_Dist': dist(*params)
         })
-    except Exception as e:
-        print(f"Error fitting {name}: {str(e)}")
+    return fitted
+
+def _put_cached_fits(cache, key, fitted):
+    # Everything but the fitted distribution objects, rebuilt on a hit
+    columns = ('Distribution', 'Parameters', 'KS Statistic (D)', 'AIC')
+    cache.put(key, [{column: r[column] for column in columns} for r in fitted])
+
+def fit_distributions_cached(data, distributions, cache_dir='.distfit_cache', max_workers=1):
+    """
+    fit_distributions with an on-disk cache (result_cache.ResultCache in
+    cache_dir) keyed by the data hash, the candidate families and the source
+    of the fitting code, so unchanged inputs are not refitted.
 
-# Create results DataFrame
-results_df = pd.DataFrame(results)
+    Returns:
+    - (list of result dictionaries, True if they came from the cache)
+    """
+    from result_cache import ResultCache
+
+    cache = ResultCache(cache_dir)
+    key = _fit_cache_key(cache, data, distributions)
+    fitted = _get_cached_fits(cache, key, distributions)
+    if fitted is not None:
+        return fitted, True
 
-# Sort by KS Statistic for best/worst identification
-results_df_sorted_ks = results_df.sort_values('KS Statistic (D)')
+    fitted = fit_distributions(data, distributions, max_workers=max_workers)
+    _put_cached_fits(cache, key, fitted)
+    return fitted, False
 
-# Display results
-print("Fitting Results (sorted by KS statistic):")
-print(results_df_sorted_ks[['Distribution', 'KS Statistic (D)', 'AIC']])
-print("\nFitting Results (sorted by AIC):")
-print(results_df.sort_values('AIC')[['Distribution', 'KS Statistic (D)', 'AIC']])
+def _fit_column_task(args):
+    # Worker: fit every family to one column, serially
+    values, distributions = args
+    return fit_distributions(values, distributions)
+
+def fit_batch(sources, distributions, columns=None, skip_columns=('Index',),
+              cache_dir='.distfit_cache', max_workers=1):
+    """
+    Fits every candidate family to every numeric column of many CSV files.
 
-# Identify best and worst fits based on KS statistic
-best_dist_row_ks = results_df_sorted_ks.iloc[0]
-worst_dist_row_ks = results_df_sorted_ks.iloc[-1]
+    Parameters:
+    - sources: a directory (all *.csv files in it), a CSV path, or a list of paths
+    - distributions: list of (name, scipy distribution, number of parameters)
+    - columns: columns to fit (default: all numeric columns)
+    - skip_columns: columns never fitted (e.g. row indices)
+    - cache_dir: directory of cached fit results (None disables the cache)
+    - max_workers: processes fitting columns in parallel, one shared pool
+      (1 fits them in this process, None uses all cores)
 
-best_dist_ks_name = best_dist_row_ks['Distribution']
-worst_dist_ks_name = worst_dist_row_ks['Distribution']
+    Returns:
+    - DataFrame with one row per (file, column, distribution)
+    """
+    import pandas as pd
+    from result_cache import ResultCache
 
-best_dist_ks_obj = best_dist_row_ks['Fitted_Dist']
-worst_dist_ks_obj = worst_dist_row_ks['Fitted_Dist']
+    if isinstance(sources, str):
+        sources = sorted(glob.glob(os.path.join(sources, '*.csv'))) if os.path.isdir(sources) else [sources]
+    cache = ResultCache(cache_dir) if cache_dir is not None else None
 
-print(f"\nBest fitting distribution (by KS): {best_dist_ks_name}")
-print(f"Worst fitting distribution (by KS): {worst_dist_ks_name}")
+    # Look every column up in the cache; the misses are fitted below
+    entries = []  # [path, column, fitted, from cache]
+    pending = []  # (entry index, values, cache key)
+    for path in sources:
+        frame = pd.read_csv(path)
+        names = columns if columns is not None else frame.select_dtypes('number').columns
+        for column in names:
+            if column in skip_columns or column not in frame:
+                continue
+            values = frame[column].dropna().to_numpy(dtype=float)
+            key = fitted = None
+            if cache is not None:
+                key = _fit_cache_key(cache, values, distributions)
+                fitted = _get_cached_fits(cache, key, distributions)
+            if fitted is None:
+                pending.append((len(entries), values, key))
+            entries.append([path, column, fitted, fitted is not None])
 
-# Identify best and worst fits based on AIC
-results_df_sorted_aic = results_df.sort_values('AIC')
-best_dist_aic_name = results_df_sorted_aic.iloc[0]['Distribution']
-worst_dist_aic_name = results_df_sorted_aic.iloc[-1]['Distribution']
+    # One task per column, spread over a single pool
+    tasks = [(values, distributions) for _, values, _ in pending]
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        fits = [_fit_column_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            fits = list(executor.map(_fit_column_task, tasks,
+                                     chunksize=max(1, len(tasks) // (4 * workers))))
+    for (index, _, key), fitted in zip(pending, fits):
+        entries[index][2] = fitted
+        if cache is not None:
+            _put_cached_fits(cache, key, fitted)
 
-print(f"\nBest fitting distribution (by AIC): {best_dist_aic_name}")
-print(f"Worst fitting distribution (by AIC): {worst_dist_aic_name}")
+    rows = []
+    for path, column, fitted, from_cache in entries:
+        for r in fitted:
+            rows.append({
+                'File': path,
+                'Column': column,
+                'Distribution': r['Distribution'],
+                'KS Statistic (D)': r['KS Statistic (D)'],
+                'AIC': r['AIC'],
+                'Parameters': r['Parameters'],
+                'Cached': from_cache
+            })
+    return pd.DataFrame(rows)
+
+# --- Streaming (Out-of-Core) Fitting ---
+def iter_column_chunks(path, column='Value', chunksize=1_000_000, dtype=np.float64):
+    """
+    Yields one numeric column in chunks without loading the whole file:
+    CSV files through pandas chunks, .npy files through a memory map and any
+    other file as a raw binary array of dtype (memory-mapped).
+    """
+    if path.endswith('.csv'):
+        import pandas as pd
+        for frame in pd.read_csv(path, usecols=[column], chunksize=chunksize):
+            yield frame[column].dropna().to_numpy(dtype=float)
+        return
+    values = np.load(path, mmap_mode='r') if path.endswith('.npy') else np.memmap(path, dtype=dtype, mode='r')
+    for start in range(0, len(values), chunksize):
+        yield np.asarray(values[start:start + chunksize], dtype=float)
+
+def streaming_summary(chunks, sketch_k=2000, rng=None):
+    """
+    One pass over data chunks: count, mean and variance (StreamingStats),
+    min, max and a mergeable quantile sketch. The sketch compacts with
+    alternating offsets, or random ones drawn from rng if given, so the
+    summary of the same data is reproducible.
+    """
+    acc = StreamingStats(quantile_k=sketch_k, rng=rng)
+    data_min, data_max = np.inf, -np.inf
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        acc.update_many(chunk)
+        data_min = min(data_min, chunk.min())
+        data_max = max(data_max, chunk.max())
+    return {
+        'count': acc.count,
+        'mean': acc.mean,
+        'std': acc.std(ddof=0),
+        'min': data_min,
+        'max': data_max,
+        'sketch': acc.sketch
+    }
+
+def fit_streaming(path, distributions, column='Value', chunksize=1_000_000, sketch_k=2000,
+                  pseudo_sample_size=10000, rng=None):
+    """
+    Fits the candidate families to a file too large to load, in two passes.
+
+    The first pass collects sufficient statistics and a quantile sketch.
+    Normal, exponential and uniform are fitted exactly from the sufficient
+    statistics; gamma and Weibull are fitted (warm-started) to a
+    quantile-matched pseudo-sample of pseudo_sample_size points taken from
+    the sketch. The second pass accumulates each fit's log-likelihood for
+    the AIC. The KS statistic is measured against the sketch's empirical CDF,
+    so it is approximate (error of order 1 / sketch_k). The sketch is built
+    by streaming_summary (with rng), so refitting an unchanged file gives
+    the same results.
+
+    Returns:
+    - (list of result dictionaries as in fit_distributions, summary dict
+      with the sketch, e.g. for chi-square bin counts via sketch.cdf)
+    """
+    summary = streaming_summary(iter_column_chunks(path, column, chunksize), sketch_k, rng)
+    sketch = summary['sketch']
+    pseudo_sample = sketch.quantile((np.arange(pseudo_sample_size) + 0.5) / pseudo_sample_size)
+    # Pin the exact extremes so a fitted location never exceeds the data minimum
+    pseudo_sample[0], pseudo_sample[-1] = summary['min'], summary['max']
+
+    fitted = []
+    for name, dist, k in distributions:
+        try:
+            if dist.name == 'norm':
+                params = (summary['mean'], summary['std'])
+            elif dist.name == 'expon':
+                params = (summary['min'], summary['mean'] - summary['min'])
+            elif dist.name == 'uniform':
+                params = (summary['min'], summary['max'] - summary['min'])
+            else:
+                params = warm_start_fit(dist, pseudo_sample)
+            fitted.append((name, dist, k, params, dist(*params)))
+        except Exception as e:
+            print(f"Error fitting {name}: {str(e)}")
+
+    # Second pass: log-likelihood of every fit
+    log_likelihood = np.zeros(len(fitted))
+    for chunk in iter_column_chunks(path, column, chunksize):
+        for j, (_, _, _, _, fitted_dist) in enumerate(fitted):
+            log_likelihood[j] += np.sum(fitted_dist.logpdf(chunk))
+
+    # KS statistic against the sketch's empirical CDF
+    items, cum_fraction = sketch.sorted_items()
+    below = np.concatenate(([0.0], cum_fraction[:-1]))
+
+    results = []
+    for j, (name, dist, k, params, fitted_dist) in enumerate(fitted):
+        cdf = fitted_dist.cdf(items)
+        D = max(np.max(cum_fraction - cdf), np.max(cdf - below))
+        results.append({
+            'Distribution': name,
+            'Parameters': params,
+            'KS Statistic (D)': D,
+            'AIC': 2 * k - 2 * log_likelihood[j],
+            'Fitted_Dist': fitted_dist
+        })
+    return results, summary
 
 # --- Chi-Square Goodness of Fit Test Function ---
-def chi_square_test(data, dist_obj, dist_name, alpha=0.05, min_expected_freq=5):
+def chi_square_bins(n, min_expected_freq=5):
+    """
+    Number of equal-probability bins for a sample of size n: the largest
+    count up to Sturges' rule whose expected frequency n / num_bins is at
+    least min_expected_freq, but never fewer than max(5, sturges // 3).
+    """
+    # Initial number of bins using Sturges' rule as starting point
+    initial_bins = int(np.ceil(np.log2(n) + 1))
+    min_bins = max(5, initial_bins//3)
+    num_bins = min(initial_bins, int(np.floor(n / min_expected_freq)))
+    return num_bins if num_bins > min_bins else min_bins
+
+@functools.lru_cache(maxsize=256)
+def _equal_probability_edges(dist_name, args, kwds, num_bins):
+    # Edges by (distribution name, parameters, number of bins), keeping the
+    # most recently used fits
+    import scipy.stats as stats
+    dist_obj = getattr(stats, dist_name)(*args, **dict(kwds))
+    return dist_obj.ppf(np.linspace(0.001, 0.999, num_bins + 1))
+
+def equal_probability_edges(dist_obj, num_bins):
+    """
+    Bin edges at the 0.001 ... 0.999 quantiles of a fitted distribution,
+    cached so repeated tests of the same fit skip the ppf evaluation.
+    """
+    edges = _equal_probability_edges(dist_obj.dist.name, tuple(dist_obj.args),
+                                     tuple(sorted(dist_obj.kwds.items())), num_bins)
+    return edges.copy()
+
+def chi_square_test(data, dist_obj, dist_name, alpha=0.05, min_expected_freq=5,
+                    sorted_data=None):
     """
     Performs Chi-Square goodness of fit test.
     
@@ -90,41 +545,33 @@ def chi_square_test(data, dist_obj, dist_name, alpha=0.05, min_expected_freq=5):
     - dist_name: name of the distribution
     - alpha: significance level (default 0.05)
     - min_expected_freq: minimum expected frequency per bin (default 5)
+    - sorted_data: np.sort(data), if already available
     
     Returns:
     - Dictionary with test results
     """
-    n = len(data)
+    if sorted_data is None:
+        sorted_data = np.sort(data)
+    n = len(sorted_data)
     
-    # Initial number of bins using Sturges' rule as starting point
-    initial_bins = int(np.ceil(np.log2(n) + 1))
+    # Number of bins ensuring minimum expected frequency
+    num_bins = chi_square_bins(n, min_expected_freq)
     
-    # Find appropriate number of bins ensuring minimum expected frequency
-    for num_bins in range(initial_bins, max(5, initial_bins//3), -1):
-        # Create bins with equal probability intervals
-        bin_edges = dist_obj.ppf(np.linspace(0.001, 0.999, num_bins + 1))
-        
-        # Handle infinite values by using data range
-        bin_edges[0] = min(bin_edges[0], data.min() - 1e-6)
-        bin_edges[-1] = max(bin_edges[-1], data.max() + 1e-6)
-        
-        # Count observed frequencies
-        observed_freq, _ = np.histogram(data, bins=bin_edges)
-        
-        # Calculate expected frequencies
-        expected_freq = np.full(num_bins, n / num_bins)
-        
-        # Check if all expected frequencies meet minimum requirement
-        if np.all(expected_freq >= min_expected_freq):
-            break
-    else:
-        # If we can't find suitable bins, use minimum bins
-        num_bins = max(5, initial_bins//3)
-        bin_edges = dist_obj.ppf(np.linspace(0.001, 0.999, num_bins + 1))
-        bin_edges[0] = min(bin_edges[0], data.min() - 1e-6)
-        bin_edges[-1] = max(bin_edges[-1], data.max() + 1e-6)
-        observed_freq, _ = np.histogram(data, bins=bin_edges)
-        expected_freq = np.full(num_bins, n / num_bins)
+    # Create bins with equal probability intervals
+    bin_edges = equal_probability_edges(dist_obj, num_bins)
+    
+    # Handle infinite values by using data range
+    bin_edges[0] = min(bin_edges[0], sorted_data[0] - 1e-6)
+    bin_edges[-1] = max(bin_edges[-1], sorted_data[-1] + 1e-6)
+    
+    # Count observed frequencies: same as np.histogram (half-open bins,
+    # last bin closed) by binary search on the sorted data
+    positions = np.searchsorted(sorted_data, bin_edges, side='left')
+    positions[-1] = np.searchsorted(sorted_data, bin_edges[-1], side='right')
+    observed_freq = np.diff(positions)
+    
+    # Calculate expected frequencies
+    expected_freq = np.full(num_bins, n / num_bins)
     
     # Calculate Chi-Square statistic
     chi2_stat = np.sum((observed_freq - expected_freq)**2 / expected_freq)
@@ -142,6 +589,7 @@ def chi_square_test(data, dist_obj, dist_name, alpha=0.05, min_expected_freq=5):
     df = max(1, df)  # Ensure at least 1 degree of freedom
     
     # Calculate p-value
+    import scipy.stats as stats
     p_value = 1 - stats.chi2.cdf(chi2_stat, df)
     
     # Critical value
@@ -164,82 +612,192 @@ def chi_square_test(data, dist_obj, dist_name, alpha=0.05, min_expected_freq=5):
         'Bin_Edges': bin_edges
     }
 
-# --- Perform Chi-Square Tests ---
-print("\n" + "="*60)
-print("CHI-SQUARE GOODNESS OF FIT TESTS (α = 0.05)")
-print("="*60)
-
-# Test for best fitting distribution
-best_chi2_result = chi_square_test(data, best_dist_ks_obj, best_dist_ks_name)
-
-print(f"\nBest Distribution: {best_chi2_result['Distribution']}")
-print(f"Chi-Square Statistic: {best_chi2_result['Chi2_Statistic']:.4f}")
-print(f"Degrees of Freedom: {best_chi2_result['Degrees_of_Freedom']}")
-print(f"P-Value: {best_chi2_result['P_Value']:.6f}")
-print(f"Critical Value (α=0.05): {best_chi2_result['Critical_Value']:.4f}")
-print(f"Number of Bins Used: {best_chi2_result['Num_Bins']}")
-
-if best_chi2_result['Reject_Null']:
-    print("Decision: REJECT H₀ - The data does NOT follow this distribution")
-    print("Interpretation: At α=0.05, we have sufficient evidence to conclude that")
-    print(f"               the data does not follow a {best_dist_ks_name} distribution.")
-else:
-    print("Decision: FAIL TO REJECT H₀ - The data follows this distribution")
-    print("Interpretation: At α=0.05, we do not have sufficient evidence to conclude that")
-    print(f"               the data does not follow a {best_dist_ks_name} distribution.")
-
-# Test for worst fitting distribution
-worst_chi2_result = chi_square_test(data, worst_dist_ks_obj, worst_dist_ks_name)
-
-print(f"\nWorst Distribution: {worst_chi2_result['Distribution']}")
-print(f"Chi-Square Statistic: {worst_chi2_result['Chi2_Statistic']:.4f}")
-print(f"Degrees of Freedom: {worst_chi2_result['Degrees_of_Freedom']}")
-print(f"P-Value: {worst_chi2_result['P_Value']:.6f}")
-print(f"Critical Value (α=0.05): {worst_chi2_result['Critical_Value']:.4f}")
-print(f"Number of Bins Used: {worst_chi2_result['Num_Bins']}")
-
-if worst_chi2_result['Reject_Null']:
-    print("Decision: REJECT H₀ - The data does NOT follow this distribution")
-    print("Interpretation: At α=0.05, we have sufficient evidence to conclude that")
-    print(f"               the data does not follow a {worst_dist_ks_name} distribution.")
-else:
-    print("Decision: FAIL TO REJECT H₀ - The data follows this distribution")
-    print("Interpretation: At α=0.05, we do not have sufficient evidence to conclude that")
-    print(f"               the data does not follow a {worst_dist_ks_name} distribution.")
-
-# --- Statistical Summary ---
-print(f"\n" + "="*60)
-print("STATISTICAL SUMMARY")
-print("="*60)
-print(f"Sample Size: {len(data)}")
-print(f"Significance Level: α = 0.05")
-print(f"Test Type: Chi-Square Goodness of Fit")
-print(f"Best Distribution (KS): {best_dist_ks_name} (D = {best_dist_row_ks['KS Statistic (D)']:.4f})")
-print(f"Worst Distribution (KS): {worst_dist_ks_name} (D = {worst_dist_row_ks['KS Statistic (D)']:.4f})")
-
-# --- Optional: Create histogram comparison plots ---
-fig, axes = plt.subplots(1, 2, figsize=(15, 6))
-
-# Plot for best distribution
-x_range = np.linspace(data.min(), data.max(), 1000)
-axes[0].hist(data, bins=30, density=True, alpha=0.7, color='skyblue', label='Observed Data')
-axes[0].plot(x_range, best_dist_ks_obj.pdf(x_range), 'r-', linewidth=2, 
-             label=f'Fitted {best_dist_ks_name}')
-axes[0].set_xlabel('Value')
-axes[0].set_ylabel('Density')
-axes[0].set_title(f'Best Fit: {best_dist_ks_name} Distribution\n(χ² = {best_chi2_result["Chi2_Statistic"]:.4f}, p = {best_chi2_result["P_Value"]:.4f})')
-axes[0].legend()
-axes[0].grid(True, alpha=0.3)
-
-# Plot for worst distribution
-axes[1].hist(data, bins=30, density=True, alpha=0.7, color='lightcoral', label='Observed Data')
-axes[1].plot(x_range, worst_dist_ks_obj.pdf(x_range), 'r-', linewidth=2, 
-             label=f'Fitted {worst_dist_ks_name}')
-axes[1].set_xlabel('Value')
-axes[1].set_ylabel('Density')
-axes[1].set_title(f'Worst Fit: {worst_dist_ks_name} Distribution\n(χ² = {worst_chi2_result["Chi2_Statistic"]:.4f}, p = {worst_chi2_result["P_Value"]:.4f})')
-axes[1].legend()
-axes[1].grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+def chi_square_tests(data, fitted, alpha=0.05, min_expected_freq=5):
+    """
+    Chi-Square tests for several fitted distributions, sorting the data once.
+    
+    Parameters:
+    - data: observed data
+    - fitted: iterable of (dist_name, dist_obj) pairs, or result rows with
+      'Distribution' and 'Fitted_Dist' keys
+    - alpha, min_expected_freq: as for chi_square_test
+    
+    Returns:
+    - Dictionary dist_name -> chi_square_test result, in input order
+    """
+    sorted_data = np.sort(data)
+    tests = {}
+    for item in fitted:
+        if isinstance(item, dict):
+            dist_name, dist_obj = item['Distribution'], item['Fitted_Dist']
+        else:
+            dist_name, dist_obj = item
+        tests[dist_name] = chi_square_test(data, dist_obj, dist_name, alpha,
+                                           min_expected_freq, sorted_data=sorted_data)
+    return tests
+
+# --- Report ---
+def run_analysis(data, distributions=None, bootstrap_resamples=0, max_workers=1, seed=1):
+    """
+    Fits every candidate family, optionally adds bootstrap KS p-values and
+    runs the Chi-Square test for every fit.
+
+    Returns:
+    - Dictionary with the fitted 'results' and the 'chi2' test results by name
+    """
+    if distributions is None:
+        distributions = default_distributions()
+    profiling.count("observations", len(data))
+    with profiling.phase("fit"):
+        results = fit_distributions(data, distributions, max_workers)
+    if bootstrap_resamples:
+        with profiling.phase("bootstrap"):
+            add_bootstrap_pvalues(results, data, bootstrap_resamples, np.random.default_rng(seed),
+                                  max_workers)
+        profiling.count("bootstrap_resamples", bootstrap_resamples * len(results))
+    with profiling.phase("test"):
+        chi2 = chi_square_tests(data, results)
+    return {'results': results, 'chi2': chi2}
+
+def print_data_summary(data):
+    print(f"Data summary: Min={data.min():.3f}, Max={data.max():.3f}, Mean={data.mean():.3f}, Median={np.median(data):.3f}, Std={data.std():.3f}\n")
+
+def print_chi2_result(label, chi2_result):
+    dist_name = chi2_result['Distribution']
+    print(f"\n{label} Distribution: {dist_name}")
+    print(f"Chi-Square Statistic: {chi2_result['Chi2_Statistic']:.4f}")
+    print(f"Degrees of Freedom: {chi2_result['Degrees_of_Freedom']}")
+    print(f"P-Value: {chi2_result['P_Value']:.6f}")
+    print(f"Critical Value (α=0.05): {chi2_result['Critical_Value']:.4f}")
+    print(f"Number of Bins Used: {chi2_result['Num_Bins']}")
+
+    if chi2_result['Reject_Null']:
+        print("Decision: REJECT H₀ - The data does NOT follow this distribution")
+        print("Interpretation: At α=0.05, we have sufficient evidence to conclude that")
+        print(f"               the data does not follow a {dist_name} distribution.")
+    else:
+        print("Decision: FAIL TO REJECT H₀ - The data follows this distribution")
+        print("Interpretation: At α=0.05, we do not have sufficient evidence to conclude that")
+        print(f"               the data does not follow a {dist_name} distribution.")
+
+def print_report(data, analysis):
+    """
+    Prints the fitting tables, the best and worst fits by KS and AIC, and
+    the Chi-Square tests of the best and worst fit by KS.
+
+    Returns:
+    - (best, worst) result rows by KS statistic
+    """
+    import pandas as pd
+
+    results = analysis['results']
+    chi2_results = analysis['chi2']
+
+    # Create results DataFrame
+    results_df = pd.DataFrame(results)
+
+    # Sort by KS Statistic for best/worst identification
+    results_df_sorted_ks = results_df.sort_values('KS Statistic (D)')
+
+    # Display results
+    table_columns = ['Distribution', 'KS Statistic (D)', 'AIC']
+    if 'KS p-value (bootstrap)' in results_df:
+        table_columns.insert(2, 'KS p-value (bootstrap)')
+    print("Fitting Results (sorted by KS statistic):")
+    print(results_df_sorted_ks[table_columns])
+    print("\nFitting Results (sorted by AIC):")
+    print(results_df.sort_values('AIC')[table_columns])
+
+    # Identify best and worst fits based on KS statistic
+    best_dist_row_ks = results_df_sorted_ks.iloc[0]
+    worst_dist_row_ks = results_df_sorted_ks.iloc[-1]
+
+    best_dist_ks_name = best_dist_row_ks['Distribution']
+    worst_dist_ks_name = worst_dist_row_ks['Distribution']
+
+    print(f"\nBest fitting distribution (by KS): {best_dist_ks_name}")
+    print(f"Worst fitting distribution (by KS): {worst_dist_ks_name}")
+
+    # Identify best and worst fits based on AIC
+    results_df_sorted_aic = results_df.sort_values('AIC')
+    best_dist_aic_name = results_df_sorted_aic.iloc[0]['Distribution']
+    worst_dist_aic_name = results_df_sorted_aic.iloc[-1]['Distribution']
+
+    print(f"\nBest fitting distribution (by AIC): {best_dist_aic_name}")
+    print(f"Worst fitting distribution (by AIC): {worst_dist_aic_name}")
+
+    # --- Chi-Square Tests ---
+    print("\n" + "="*60)
+    print("CHI-SQUARE GOODNESS OF FIT TESTS (α = 0.05)")
+    print("="*60)
+
+    print_chi2_result("Best", chi2_results[best_dist_ks_name])
+    print_chi2_result("Worst", chi2_results[worst_dist_ks_name])
+
+    # --- Statistical Summary ---
+    print(f"\n" + "="*60)
+    print("STATISTICAL SUMMARY")
+    print("="*60)
+    print(f"Sample Size: {len(data)}")
+    print(f"Significance Level: α = 0.05")
+    print(f"Test Type: Chi-Square Goodness of Fit")
+    print(f"Best Distribution (KS): {best_dist_ks_name} (D = {best_dist_row_ks['KS Statistic (D)']:.4f})")
+    print(f"Worst Distribution (KS): {worst_dist_ks_name} (D = {worst_dist_row_ks['KS Statistic (D)']:.4f})")
+
+    return best_dist_row_ks, worst_dist_row_ks
+
+def plot_report(data, best, worst, chi2_results, output=None):
+    """
+    Histogram of the data against the best and worst fitted PDFs. With
+    output (a .png or .svg path) the figure is rendered headless and saved
+    there instead of shown.
+    """
+    from plotting import finish_figure, histogram_counts, new_figure, plot_binned
+
+    fig = new_figure((15, 6), output)
+    axes = fig.subplots(1, 2)
+    x_range = np.linspace(data.min(), data.max(), 1000)
+    # Bin the data once (in chunks) for both panels
+    counts, edges = histogram_counts(data, bins=30)
+
+    for ax, label, row, color in ((axes[0], 'Best', best, 'skyblue'),
+                                  (axes[1], 'Worst', worst, 'lightcoral')):
+        dist_name = row['Distribution']
+        chi2_result = chi2_results[dist_name]
+        plot_binned(ax, counts, edges, alpha=0.7, color=color, label='Observed Data')
+        ax.plot(x_range, row['Fitted_Dist'].pdf(x_range), 'r-', linewidth=2,
+                label=f'Fitted {dist_name}')
+        ax.set_xlabel('Value')
+        ax.set_ylabel('Density')
+        ax.set_title(f'{label} Fit: {dist_name} Distribution\n(χ² = {chi2_result["Chi2_Statistic"]:.4f}, p = {chi2_result["P_Value"]:.4f})')
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+
+    finish_figure(fig, output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit candidate distributions to a data column.")
+    parser.add_argument('path', nargs='?', default=data_path, help="CSV file")
+    parser.add_argument('--column', default=data_column)
+    parser.add_argument('--bootstrap', type=int, default=bootstrap_resamples,
+                        help="parametric-bootstrap resamples for KS p-values (0 disables)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes fitting in parallel (0 uses all cores)")
+    parser.add_argument('--no-plot', action='store_true', help="skip the histogram plots")
+    parser.add_argument('--output', help="save the plots to this file (.png, .svg) instead of showing them")
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with profiling.session(args.profile, args.profile_output):
+        with profiling.phase("load"):
+            data = load_data(args.path, args.column)
+        print_data_summary(data)
+
+        analysis = run_analysis(data, bootstrap_resamples=args.bootstrap, max_workers=args.workers or None)
+        with profiling.phase("report"):
+            best, worst = print_report(data, analysis)
+            if not args.no_plot:
+                plot_report(data, best, worst, analysis['chi2'], args.output)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
+import argparse
 import random
+import functools
+from statistics import NormalDist
 import numpy as np
 
+import profiling
+from discrete_dist import DiscreteDistribution
+from streaming_stats import StreamingStats, run_until_precision
+
 # Constants
 bagelPrice = 1.4  # Regular selling price per bagel
 discountPrice = 0.7  # Half-price for unsold bagels
@@ -14,38 +21,35 @@ totalRevenue = []
 
 # Possible values to test
 bake_options = [216, 228, 240, 252, 264, 276, 288, 300]
-results = {}
+
+# Number of simulated days per baking option
+num_days = 500
+
+# Use the vectorized NumPy engine (simulate_days_batch) instead of simulate_day
+use_batch_engine = False
+
+# Demand tables used by simulate_day (cumulative probabilities as upper bounds)
+customerCounts = np.array([10, 12, 14, 16, 18])
+customerCountCumProbs = np.array([0.20, 0.30, 0.60, 0.85, 1.00])
+bagelsPerOrder = np.array([12, 24, 36, 48])
+orderCumProbs = np.array([0.30, 0.70, 0.95, 1.00])
+customerCountDist = DiscreteDistribution.from_cumulative(customerCounts, customerCountCumProbs)
+orderDist = DiscreteDistribution.from_cumulative(bagelsPerOrder, orderCumProbs)
 
 # Function to simulate one day
-def simulate_day(num_to_bake):
+def simulate_day(num_to_bake, rng=None):
+    # Uniforms from the given numpy Generator, or the global random module
+    uniform = random.random if rng is None else rng.random
+
     # Generate customer count
-    prob1 = random.random()
-    
-    if 0 <= prob1 <= 0.20:
-        customer_count = 10
-    elif 0.20 < prob1 <= 0.30:
-        customer_count = 12
-    elif 0.30 < prob1 <= 0.60:
-        customer_count = 14
-    elif 0.60 < prob1 <= 0.85:
-        customer_count = 16
-    else:  # 0.85 < prob1 <= 1
-        customer_count = 18
+    prob1 = uniform()
+    customer_count = customerCountDist.from_uniform(prob1)
         
     # Determine bagels ordered by each customer
     total_ordered = 0
     for _ in range(customer_count):
-        prob2 = random.random()
-        
-        if 0 <= prob2 <= 0.30:
-            bagels_ordered = 12
-        elif 0.30 < prob2 <= 0.70:  # 0.30 + 0.40
-            bagels_ordered = 24
-        elif 0.70 < prob2 <= 0.95:  # 0.70 + 0.25
-            bagels_ordered = 36
-        else:  # 0.95 < prob2 <= 1
-            bagels_ordered = 48
-            
+        prob2 = uniform()
+        bagels_ordered = orderDist.from_uniform(prob2)
         total_ordered += bagels_ordered
     
     # Calculate sales and revenue
@@ -67,38 +71,417 @@ def simulate_day(num_to_bake):
         'profit': profit
     }
 
-# Run simulation for each baking option
-for num_to_bake in bake_options:
-    daily_profits = []
-    daily_results = []
-    
-    # Run 500 simulations for each option
-    for _ in range(500):
-        day_result = simulate_day(num_to_bake)
-        daily_profits.append(day_result['profit'])
-        daily_results.append(day_result)
-    
-    # Store results
-    results[num_to_bake] = {
-        'avg_profit': np.mean(daily_profits),
-        'std_profit': np.std(daily_profits),
-        'total_profit': sum(daily_profits),
-        'avg_unsold': np.mean([r['unsold'] for r in daily_results]),
-        'avg_ordered': np.mean([r['ordered'] for r in daily_results]),
-        'lost_sales_pct': np.mean([1 if r['ordered'] > r['sold'] else 0 for r in daily_results]) * 100
+# Function to draw total bagels ordered for m days as an array
+def _draw_daily_orders(m, rng):
+    # Customer count per day
+    customer_count = customerCountDist.sample(m, rng)
+
+    # Orders for up to max_customers per day, masking unused slots
+    max_customers = customerCounts[-1]
+    orders = orderDist.sample((m, max_customers), rng)
+    orders[np.arange(max_customers) >= customer_count[:, None]] = 0
+    return orders.sum(axis=1)
+
+# Function to simulate many days for all baking options at once
+def simulate_days_batch(bake_options, num_days, rng=None, chunk_days=2**18):
+    """
+    Vectorized version of simulate_day for every baking option.
+
+    Customer counts and per-customer orders are drawn as arrays with the same
+    tables as simulate_day, and each day's demand is evaluated against all
+    bake quantities by broadcasting, so every option sees the same demand.
+    Days are processed in chunks of chunk_days to keep memory bounded.
+
+    Returns a dict keyed by bake quantity with the same columns as
+    run_bake_options.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    bake = np.asarray(bake_options, dtype=float)
+
+    # Running totals per bake option
+    profit_mean = np.zeros(len(bake))
+    profit_m2 = np.zeros(len(bake))
+    total_profit = np.zeros(len(bake))
+    total_unsold = np.zeros(len(bake))
+    total_ordered = 0.0
+    lost_days = np.zeros(len(bake))
+    days_done = 0
+
+    while days_done < num_days:
+        m = min(chunk_days, num_days - days_done)
+
+        with profiling.phase("rng"):
+            ordered = _draw_daily_orders(m, rng)
+        profiling.count("days", m)
+
+        # Sales and profit for every bake option (days x options)
+        with profiling.phase("simulate"):
+            sold = np.minimum(ordered[:, None], bake)
+            unsold = bake - sold
+            profit = sold * bagelPrice + unsold * discountPrice - bake * productionCost
+
+        with profiling.phase("aggregate"):
+            # Merge chunk mean/variance into running totals (Chan et al.)
+            chunk_mean = profit.mean(axis=0)
+            chunk_m2 = ((profit - chunk_mean) ** 2).sum(axis=0)
+            n = days_done + m
+            delta = chunk_mean - profit_mean
+            profit_mean += delta * m / n
+            profit_m2 += chunk_m2 + delta ** 2 * days_done * m / n
+
+            total_profit += profit.sum(axis=0)
+            total_unsold += unsold.sum(axis=0)
+            total_ordered += ordered.sum()
+            lost_days += (ordered[:, None] > bake).sum(axis=0)
+        days_done = n
+
+    batch_results = {}
+    for i, num_to_bake in enumerate(bake_options):
+        batch_results[num_to_bake] = {
+            'avg_profit': profit_mean[i],
+            'std_profit': np.sqrt(profit_m2[i] / num_days),
+            'total_profit': total_profit[i],
+            'avg_unsold': total_unsold[i] / num_days,
+            'avg_ordered': total_ordered / num_days,
+            'lost_sales_pct': lost_days[i] / num_days * 100
+        }
+    return batch_results
+
+# Function to simulate one option until its mean profit is known precisely enough
+def simulate_until_precision(num_to_bake, target_half_width, rng=None, confidence=0.95,
+                             block_days=10000, max_days=None):
+    """
+    Simulates days for one baking option in blocks until the confidence
+    interval half-width of the average profit is at most target_half_width.
+
+    Returns a dict with the same columns as run_bake_options, plus the
+    number of simulated days, the achieved half-width and profit quantiles.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    def draw_profits():
+        ordered = _draw_daily_orders(block_days, rng)
+        sold = np.minimum(ordered, num_to_bake)
+        unsold = num_to_bake - sold
+        unsold_stats.update_many(unsold)
+        ordered_stats.update_many(ordered)
+        lost_stats.update_many(ordered > sold)
+        return sold * bagelPrice + unsold * discountPrice - num_to_bake * productionCost
+
+    unsold_stats = StreamingStats(quantile_k=None)
+    ordered_stats = StreamingStats(quantile_k=None)
+    lost_stats = StreamingStats(quantile_k=None)
+    # The profit quantile sketch gets its own stream spawned from rng
+    profit_stats = run_until_precision(draw_profits, target_half_width, confidence=confidence,
+                                       method="iid", min_count=block_days, max_count=max_days,
+                                       stats=StreamingStats(rng=rng.spawn(1)[0]))
+
+    p5, p50, p95 = profit_stats.quantile([0.05, 0.50, 0.95])
+    return {
+        'avg_profit': profit_stats.mean,
+        'std_profit': profit_stats.std(ddof=0),
+        'total_profit': profit_stats.mean * profit_stats.count,
+        'avg_unsold': unsold_stats.mean,
+        'avg_ordered': ordered_stats.mean,
+        'lost_sales_pct': lost_stats.mean * 100,
+        'days': profit_stats.count,
+        'half_width': profit_stats.half_width(confidence, method="iid"),
+        'profit_p5': p5,
+        'profit_p50': p50,
+        'profit_p95': p95
+    }
+
+# Common-random-numbers sweep over bake quantities and price/cost scenarios
+def crn_sweep(bake_options, num_days, scenarios=None, rng=None, confidence=0.95,
+              chunk_days=2**18):
+    """
+    Compares baking options on one shared demand stream.
+
+    Every option and every scenario is evaluated on the same simulated days,
+    so differences between options are paired. Profit is linear in bagels
+    sold, so only the mean and covariance of bagels sold across options are
+    accumulated; each scenario is then evaluated from those without redrawing.
+
+    Parameters:
+    - bake_options: bake quantities to compare
+    - num_days: number of simulated days shared by all options
+    - scenarios: list of dicts with 'price', 'discount' and 'cost'
+      (default: the module constants)
+    - rng: numpy Generator (default: a fresh default_rng())
+    - confidence: confidence level of the paired-difference intervals
+
+    Returns:
+    - List of dicts, one per (scenario, option), with the average profit and
+      the paired difference to the best option of that scenario with its
+      confidence interval
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if scenarios is None:
+        scenarios = [{'price': bagelPrice, 'discount': discountPrice, 'cost': productionCost}]
+
+    bake = np.asarray(bake_options, dtype=float)
+
+    # Running mean and co-moment matrix of bagels sold per option
+    sold_mean = np.zeros(len(bake))
+    sold_comoment = np.zeros((len(bake), len(bake)))
+    days_done = 0
+
+    while days_done < num_days:
+        m = min(chunk_days, num_days - days_done)
+        ordered = _draw_daily_orders(m, rng)
+        sold = np.minimum(ordered[:, None], bake)
+
+        chunk_mean = sold.mean(axis=0)
+        centered = sold - chunk_mean
+        n = days_done + m
+        delta = chunk_mean - sold_mean
+        sold_mean += delta * m / n
+        sold_comoment += centered.T @ centered + np.outer(delta, delta) * days_done * m / n
+        days_done = n
+
+    sold_cov = sold_comoment / max(num_days - 1, 1)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    rows = []
+    for s, scenario in enumerate(scenarios):
+        margin = scenario['price'] - scenario['discount']
+        avg_profit = margin * sold_mean + bake * (scenario['discount'] - scenario['cost'])
+        best = int(np.argmax(avg_profit))
+
+        for i, num_to_bake in enumerate(bake_options):
+            diff = avg_profit[i] - avg_profit[best]
+            diff_var = margin ** 2 * (sold_cov[i, i] + sold_cov[best, best] - 2 * sold_cov[i, best])
+            half_width = z * np.sqrt(max(diff_var, 0.0) / num_days)
+            rows.append({
+                'scenario': s,
+                'num_to_bake': num_to_bake,
+                'avg_profit': avg_profit[i],
+                'diff_vs_best': diff,
+                'ci_low': diff - half_width,
+                'ci_high': diff + half_width,
+                'is_best': i == best
+            })
+    return rows
+
+# Exact daily demand distribution (compound: customer count x orders per customer)
+@functools.lru_cache(maxsize=None)
+def _demand_moments(counts, count_cum_probs, order_sizes, order_cum_probs):
+    """
+    Builds the PMF of total bagels ordered per day by convolution and
+    precomputes the cumulative sums needed to evaluate any bake quantity
+    in O(1). Arguments are tuples so the result can be cached.
+    """
+    count_probs = np.diff(count_cum_probs, prepend=0.0)
+    order_probs = np.diff(order_cum_probs, prepend=0.0)
+
+    # PMF of a single customer's order, indexed by number of bagels
+    order_pmf = np.zeros(max(order_sizes) + 1)
+    order_pmf[list(order_sizes)] = order_probs
+
+    # PMF of the sum of c orders for c = 0, 1, ..., max(counts)
+    max_demand = max(counts) * max(order_sizes)
+    pmf = np.zeros(max_demand + 1)
+    sum_pmf = np.array([1.0])
+    for c in range(max(counts) + 1):
+        if c in counts:
+            pmf[:len(sum_pmf)] += count_probs[counts.index(c)] * sum_pmf
+        sum_pmf = np.convolve(sum_pmf, order_pmf)
+
+    k = np.arange(max_demand + 1)
+    # Prefix sums: P(D < q), E[D; D < q], E[D^2; D < q] for q = 0..max_demand + 1
+    cdf_below = np.concatenate(([0.0], np.cumsum(pmf)))
+    first_below = np.concatenate(([0.0], np.cumsum(k * pmf)))
+    second_below = np.concatenate(([0.0], np.cumsum(k ** 2 * pmf)))
+    return pmf, cdf_below, first_below, second_below
+
+
+def _current_demand_moments():
+    # Look up (or build) the cached moments for the current demand tables
+    return _demand_moments(tuple(customerCounts.tolist()), tuple(customerCountCumProbs.tolist()),
+                           tuple(bagelsPerOrder.tolist()), tuple(orderCumProbs.tolist()))
+
+
+def demand_distribution():
+    """
+    Returns the exact PMF of total bagels ordered per day, indexed by
+    number of bagels, for the tables used by simulate_day.
+    """
+    return _current_demand_moments()[0]
+
+
+def exact_day_outcome(num_to_bake, price=bagelPrice, discount=discountPrice,
+                      cost=productionCost, num_days=num_days):
+    """
+    Exact expected daily outcome for baking num_to_bake bagels, using the
+    cached demand distribution instead of simulation.
+
+    Returns a dict with the same columns as run_bake_options.
+    """
+    pmf, cdf_below, first_below, second_below = _current_demand_moments()
+    q = min(int(num_to_bake), len(pmf))
+
+    # Moments of bagels sold = min(D, num_to_bake)
+    prob_at_least = 1.0 - cdf_below[q]
+    sold_mean = first_below[q] + num_to_bake * prob_at_least
+    sold_second = second_below[q] + num_to_bake ** 2 * prob_at_least
+    sold_var = max(sold_second - sold_mean ** 2, 0.0)
+
+    # Profit is linear in bagels sold
+    avg_profit = (price - discount) * sold_mean + num_to_bake * (discount - cost)
+    prob_lost = 1.0 - cdf_below[min(q + 1, len(pmf))]
+
+    return {
+        'avg_profit': avg_profit,
+        'std_profit': abs(price - discount) * np.sqrt(sold_var),
+        'total_profit': avg_profit * num_days,
+        'avg_unsold': num_to_bake - sold_mean,
+        'avg_ordered': first_below[-1],
+        'lost_sales_pct': prob_lost * 100
     }
 
-# Print results table
-print("\nSimulation Results (500 days each):\n")
-print(f"{'Bagels':>6} | {'Avg Profit':>10} | {'Total Profit':>12} | {'Unsold Avg':>10} | {'Lost Sales %':>11}")
-print("-" * 65)
 
-for num in bake_options:
-    r = results[num]
-    print(f"{num:6d} | {r['avg_profit']:10.2f} | {r['total_profit']:12.2f} | {r['avg_unsold']:10.2f} | {r['lost_sales_pct']:11.2f}")
+def exact_optimal_bake(price=bagelPrice, discount=discountPrice, cost=productionCost):
+    """
+    Exact profit-maximizing number of bagels to bake per day.
+
+    Requires discount < cost: otherwise every extra bagel earns at least
+    its cost back as a discounted sale, so baking more never lowers the
+    profit, there is no unique finite optimum and a ValueError is raised.
+
+    Returns a tuple (num_to_bake, expected daily profit).
+    """
+    if discount >= cost:
+        raise ValueError(f"baking more never lowers the profit when the discount price "
+                         f"({discount}) is at least the production cost ({cost})")
+    pmf, cdf_below, first_below, _ = _current_demand_moments()
+
+    # Expected profit for every q = 0..max demand (with discount < cost each
+    # bagel beyond the maximum demand loses cost - discount)
+    q = np.arange(len(pmf))
+    sold_mean = first_below[:-1] + q * (1.0 - cdf_below[:-1])
+    profit = (price - discount) * sold_mean + q * (discount - cost)
+    best = int(np.argmax(profit))
+    return best, profit[best]
+
+# Function to simulate every baking option as in the original study
+def run_bake_options(bake_options=bake_options, num_days=num_days, use_batch_engine=use_batch_engine,
+                     rng=None):
+    """
+    Simulates num_days days for each baking option, with simulate_day (one
+    option at a time, global random module unless rng is given) or with
+    simulate_days_batch.
+
+    Returns a dict keyed by bake quantity with the average and total profit,
+    average unsold and ordered bagels and the percentage of days with lost sales.
+    """
+    if use_batch_engine:
+        return simulate_days_batch(bake_options, num_days, rng)
+
+    results = {}
+    for num_to_bake in bake_options:
+        # Streaming accumulators keep memory constant in the number of days
+        profit_stats = StreamingStats(quantile_k=None)
+        unsold_stats = StreamingStats(quantile_k=None)
+        ordered_stats = StreamingStats(quantile_k=None)
+        lost_stats = StreamingStats(quantile_k=None)
+
+        # Run num_days simulations for each option (draws, simulation and
+        # statistics are interleaved per day, so they are timed together)
+        with profiling.phase("simulate"):
+            for _ in range(num_days):
+                day_result = simulate_day(num_to_bake, rng)
+                profit_stats.update(day_result['profit'])
+                unsold_stats.update(day_result['unsold'])
+                ordered_stats.update(day_result['ordered'])
+                lost_stats.update(1 if day_result['ordered'] > day_result['sold'] else 0)
+        profiling.count("days", num_days)
+
+        # Store results
+        results[num_to_bake] = {
+            'avg_profit': profit_stats.mean,
+            'std_profit': profit_stats.std(ddof=0),
+            'total_profit': profit_stats.mean * profit_stats.count,
+            'avg_unsold': unsold_stats.mean,
+            'avg_ordered': ordered_stats.mean,
+            'lost_sales_pct': lost_stats.mean * 100
+        }
+    return results
+
+# Function to run the baking options through the on-disk result cache
+def run_bake_options_cached(bake_options=bake_options, num_days=num_days,
+                            use_batch_engine=use_batch_engine, seed=0, cache=None):
+    """
+    run_bake_options with a numpy Generator seeded by seed, cached on disk
+    (result_cache.ResultCache, default directory unless cache is given).
+    The cache key covers the options, days, engine, prices, demand tables,
+    seed and the source of this module and its helpers.
+
+    Returns (results, True if they came from the cache).
+    """
+    from result_cache import ResultCache, code_version
+
+    if cache is None:
+        cache = ResultCache()
+    params = {
+        'bake_options': list(bake_options),
+        'num_days': num_days,
+        'use_batch_engine': use_batch_engine,
+        'prices': [bagelPrice, discountPrice, productionCost],
+        'customer_counts': [customerCounts, customerCountCumProbs],
+        'orders': [bagelsPerOrder, orderCumProbs]
+    }
+    version = code_version(run_bake_options, DiscreteDistribution, StreamingStats)
+    return cache.cached('bakery_problem.run_bake_options', params, seed, version,
+                        lambda: run_bake_options(bake_options, num_days, use_batch_engine,
+                                                 np.random.default_rng(seed)))
+
+# Function to print the results table and the best option
+def print_results(results, num_days=num_days):
+    print(f"\nSimulation Results ({num_days} days each):\n")
+    print(f"{'Bagels':>6} | {'Avg Profit':>10} | {'Total Profit':>12} | {'Unsold Avg':>10} | {'Lost Sales %':>11}")
+    print("-" * 65)
+
+    for num, r in results.items():
+        print(f"{num:6d} | {r['avg_profit']:10.2f} | {r['total_profit']:12.2f} | {r['avg_unsold']:10.2f} | {r['lost_sales_pct']:11.2f}")
+
+    # Find optimal number
+    optimal = max(results.items(), key=lambda x: x[1]['avg_profit'])
+    print(f"\nOptimal number of bagels to bake per day: {optimal[0]} (average daily profit: {optimal[1]['avg_profit']:.2f} TL)")
+
+    # "Lost Sales %" represents the percentage of days when the bakery couldn't fulfill all customer orders because they didn't bake enough bagels.
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bagel bakery simulation.")
+    parser.add_argument('--days', type=int, default=num_days, help="simulated days per baking option")
+    parser.add_argument('--bake', type=int, nargs='+', default=bake_options, help="bake quantities to compare")
+    parser.add_argument('--batch', action='store_true', default=use_batch_engine,
+                        help="use the vectorized engine (simulate_days_batch)")
+    parser.add_argument('--seed', type=int, default=None, help="random seed")
+    parser.add_argument('--cache-dir', help="reuse results of earlier seeded runs cached in this directory")
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.cache_dir and args.seed is None:
+        parser.error("--cache-dir requires --seed")
+
+    # A seeded numpy Generator for either engine, as in run_bake_options_cached,
+    # so a seed gives the same results with and without the cache
+    rng = np.random.default_rng(args.seed) if args.seed is not None else None
 
-# Find optimal number
-optimal = max(results.items(), key=lambda x: x[1]['avg_profit'])
-print(f"\nOptimal number of bagels to bake per day: {optimal[0]} (average daily profit: {optimal[1]['avg_profit']:.2f} TL)")
+    with profiling.session(args.profile, args.profile_output):
+        if args.cache_dir:
+            from result_cache import ResultCache
+            results, from_cache = run_bake_options_cached(args.bake, args.days, args.batch, args.seed,
+                                                          ResultCache(args.cache_dir))
+            if from_cache:
+                print("(results from cache)")
+        else:
+            results = run_bake_options(args.bake, args.days, args.batch, rng)
+        with profiling.phase("report"):
+            print_results(results, args.days)
 
-# "Lost Sales %" represents the percentage of days when the bakery couldn't fulfill all customer orders because they didn't bake enough bagels.
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+
+''' Benchmark suite for the models
+
+Each benchmark runs one model entry point at several input sizes and
+records the best wall time over a few repeats, the throughput (items per
+second) and the peak memory allocated during one extra run (tracemalloc,
+which also sees NumPy buffers). Results are written to JSON together with
+the git commit, so runs of two versions can be compared:
+
+    python benchmarks.py --output before.json
+    python benchmarks.py --output after.json --compare before.json
+
+Models are imported by the benchmarks that use them.
+
+'''
+
+# Seed of every benchmark's Generator, so all versions see the same draws
+seed = 12345
+
+
+def _bakery_day(size):
+    from bakery_problem import simulate_day
+    rng = np.random.default_rng(seed)
+
+    def run():
+        for _ in range(size):
+            simulate_day(264, rng)
+    return run
+
+
+def _bakery_batch(size):
+    from bakery_problem import bake_options, simulate_days_batch
+    rng = np.random.default_rng(seed)
+    return lambda: simulate_days_batch(bake_options, size, rng)
+
+
+def _heart(size):
+    from heart_specialist import simulate_heart_specialist
+    rng = np.random.default_rng(seed)
+    return lambda: simulate_heart_specialist(simulation_days=size, rng=rng)
+
+
+def _heart_batch(size):
+    from heart_specialist import simulate_heart_specialist_batch
+    rng = np.random.default_rng(seed)
+    return lambda: simulate_heart_specialist_batch(size, rng)
+
+
+def _tankers(size):
+    from oil_tankers import simulate_tankers
+    rng = np.random.default_rng(seed)
+    return lambda: simulate_tankers(size, rng)
+
+
+def _port(size, use_kernel):
+    from port_engine import simulate_port
+    rng = np.random.default_rng(seed)
+    return lambda: simulate_port(size, rng=rng, use_kernel=use_kernel)
+
+
+def _triangular(size):
+    from triangular_rand_no_generator import acceptance_rejection_triangular
+    rng = np.random.default_rng(seed)
+    return lambda: acceptance_rejection_triangular(10, 30, 40, size, rng)
+
+
+def _triangular_batch(size):
+    from triangular_rand_no_generator import acceptance_rejection_triangular_batch
+    rng = np.random.default_rng(seed)
+    return lambda: acceptance_rejection_triangular_batch(10, 30, 40, size, rng)
+
+
+def _fit(size):
+    from assignment6_distfit import default_distributions, fit_distributions
+    data = np.random.default_rng(seed).gamma(1.5, 0.6, size) + 0.15
+    distributions = default_distributions()
+    return lambda: fit_distributions(data, distributions)
+
+
+def _kernel_available():
+    from kernels import HAVE_NUMBA
+    return HAVE_NUMBA
+
+
+# (name, unit, sizes, setup) where setup(size) returns the callable to time;
+# an optional fifth entry is a check that the benchmark can run here
+benchmarks = [
+    ("bakery.simulate_day", "days", [1_000, 10_000], _bakery_day),
+    ("bakery.simulate_days_batch", "days", [10_000, 1_000_000], _bakery_batch),
+    ("heart.simulate_heart_specialist", "days", [200, 2_000], _heart),
+    ("heart.simulate_heart_specialist_batch", "days", [10_000, 1_000_000], _heart_batch),
+    ("tankers.simulate_tankers", "tankers", [10_000, 100_000], _tankers),
+    ("port.simulate_port", "tankers", [10_000, 1_000_000], lambda size: _port(size, False)),
+    ("port.simulate_port[kernel]", "tankers", [10_000, 1_000_000], lambda size: _port(size, True),
+     _kernel_available),
+    ("triangular.acceptance_rejection", "samples", [1_000, 100_000], _triangular),
+    ("triangular.acceptance_rejection_batch", "samples", [100_000, 10_000_000], _triangular_batch),
+    ("distfit.fit_distributions", "observations", [500, 50_000], _fit),
+]
+
+
+def measure(run, repeat=3):
+    """
+    Best wall time of repeat calls of run, then the peak traced memory of
+    one more call.
+
+    Returns:
+    - (seconds, peak bytes)
+    """
+    seconds = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_benchmarks(name_filter=None, repeat=3, quick=False, warmup=True):
+    """
+    Runs every benchmark whose name contains name_filter (all if None).
+    With quick only the smallest size of each is run. A warm-up call at the
+    smallest size (imports, caches, numba compilation) is not timed.
+
+    Returns:
+    - List of result dicts (name, unit, size, seconds, throughput, peak_bytes)
+    """
+    results = []
+    for name, unit, sizes, setup, *check in benchmarks:
+        if name_filter is not None and name_filter not in name:
+            continue
+        if check and not check[0]():
+            print(f"{name}: skipped (not available)")
+            continue
+        if warmup:
+            setup(sizes[0])()
+        for size in sizes[:1] if quick else sizes:
+            seconds, peak = measure(setup(size), repeat)
+            results.append({
+                "name": name,
+                "unit": unit,
+                "size": size,
+                "seconds": seconds,
+                "throughput": size / seconds if seconds > 0 else np.inf,
+                "peak_bytes": peak
+            })
+            print(f"{name:40} {size:>10} {unit:12} {seconds:10.4f} s "
+                  f"{size / seconds:14,.0f} {unit}/s {peak / 2**20:10.2f} MiB")
+    return results
+
+
+def environment():
+    """Python, NumPy, platform and git commit of the run."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor()
+    }
+
+
+def compare(results, baseline):
+    """
+    Prints the speedup (baseline time / new time) and memory ratio for every
+    (name, size) present in both result lists.
+    """
+    old = {(r["name"], r["size"]): r for r in baseline}
+    print(f"\n{'Benchmark':40} {'Size':>10} {'Speedup':>9} {'Memory':>9}")
+    for r in results:
+        base = old.get((r["name"], r["size"]))
+        if base is None:
+            continue
+        speedup = base["seconds"] / r["seconds"] if r["seconds"] > 0 else np.inf
+        memory = r["peak_bytes"] / base["peak_bytes"] if base["peak_bytes"] else np.nan
+        print(f"{r['name']:40} {r['size']:>10} {speedup:8.2f}x {memory:8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the models.")
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=3, help="timed calls per size (best is kept)")
+    parser.add_argument('--quick', action='store_true', help="only the smallest size of each benchmark")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.filter, args.repeat, args.quick)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import bisect
+import functools
+import numpy as np
+
+
+class DiscreteDistribution:
+    """
+    Discrete distribution over a table of values, built once and reused.
+
+    Holds both the cumulative table (for inverse-CDF lookup of given
+    uniforms, matching the models' if/elif ladders on a uniform draw) and a
+    Walker alias table (for O(1) sampling per draw from a Generator).
+    """
+
+    # Up to this many values a binary search is cheaper than the alias
+    # arithmetic in NumPy, so sample() uses the cumulative table
+    small_table = 16
+
+    def __init__(self, values, probabilities):
+        self.values = np.asarray(values)
+        self.probabilities = np.asarray(probabilities, dtype=float)
+        if len(self.values) != len(self.probabilities):
+            raise ValueError("values and probabilities must have the same length")
+        if np.any(self.probabilities < 0) or not np.isclose(self.probabilities.sum(), 1.0):
+            raise ValueError("probabilities must be non-negative and sum to 1")
+
+        self.cum_probs = np.cumsum(self.probabilities)
+        self.cum_probs[-1] = 1.0  # guard against round-off in the last bucket
+        self._build()
+
+    @classmethod
+    def from_cumulative(cls, values, cum_probs):
+        """
+        Builds the distribution from cumulative probabilities, used as the
+        exact upper bounds of each bucket (as in the models' if/elif ladders).
+        """
+        dist = cls(values, np.diff(cum_probs, prepend=0.0))
+        dist.cum_probs = np.asarray(cum_probs, dtype=float).copy()
+        dist._build()
+        return dist
+
+    def _build(self):
+        # Python copies for the scalar paths
+        self._value_list = self.values.tolist()
+        self._cum_list = self.cum_probs.tolist()
+
+        # Walker alias table (Vose's method)
+        k = len(self.probabilities)
+        scaled = self.probabilities * k
+        self.alias_prob = np.ones(k)
+        self.alias = np.arange(k)
+        small = [i for i in range(k) if scaled[i] < 1.0]
+        large = [i for i in range(k) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.alias_prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+    def from_uniform(self, u):
+        """
+        Inverse-CDF lookup: maps uniform(s) u in [0, 1) to values by binary
+        search on the cumulative table. Scalars return a scalar.
+        """
+        if np.isscalar(u):
+            return self._value_list[bisect.bisect_left(self._cum_list, u)]
+        return self.values[np.searchsorted(self.cum_probs, u)]
+
+    def sample(self, size=None, rng=None):
+        """
+        Draws a scalar (size=None) or an array of the given shape, one
+        uniform per draw.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        u = rng.random(size)
+        k = len(self.values)
+        if size is None or k <= self.small_table:
+            return self.from_uniform(u)
+
+        # Alias lookup: the integer part picks a column, the fraction decides
+        # between the column and its alias
+        x = u * k
+        column = x.astype(np.intp)
+        chosen = np.where(x - column < self.alias_prob[column], column, self.alias[column])
+        return self.values[chosen]
+
+    def mean(self):
+        return float(np.dot(self.values, self.probabilities))
+
+
+@functools.lru_cache(maxsize=None)
+def discrete_distribution(values, probabilities):
+    """Cached DiscreteDistribution for tuple-valued tables."""
+    return DiscreteDistribution(values, probabilities)
+
+
+@functools.lru_cache(maxsize=None)
+def discrete_distribution_cumulative(values, cum_probs):
+    """Cached DiscreteDistribution.from_cumulative for tuple-valued tables."""
+    return DiscreteDistribution.from_cumulative(values, cum_probs)
@@ -1,20 +1,42 @@
 import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
 import numpy as np
 
-def simulate_heart_specialist():
-    # Constants
-    patients_per_day = 16
-    service_time_scheduled = 30  # minutes
-    start_time = 9 * 60  # 9 AM in minutes from midnight
-    simulation_days = 200
-    
+import profiling
+from discrete_dist import discrete_distribution
+from kernels import HAVE_NUMBA, clinic_recursion
+from streaming_stats import StreamingStats, run_until_precision
+
+@dataclass(frozen=True)
+class ClinicConfig:
+    """
+    Parameters of the clinic model. The defaults are the original clinic.
+    """
+    patients_per_day: int = 16
+    service_time_scheduled: int = 30  # minutes
+    start_time: int = 9 * 60  # 9 AM in minutes from midnight
+
     # Arrival time distribution (in minutes relative to scheduled time)
-    arrival_times = [-15, -5, 0, 10, 15]
-    arrival_probabilities = [0.10, 0.25, 0.50, 0.10, 0.05]
-    
+    arrival_times: tuple = (-15, -5, 0, 10, 15)
+    arrival_probabilities: tuple = (0.10, 0.25, 0.50, 0.10, 0.05)
+
     # Service time distribution (in minutes)
-    service_times = [24, 27, 30, 33, 36, 39]
-    service_probabilities = [0.20, 0.25, 0.30, 0.10, 0.10, 0.05]
+    service_times: tuple = (24, 27, 30, 33, 36, 39)
+    service_probabilities: tuple = (0.20, 0.25, 0.30, 0.10, 0.10, 0.05)
+
+default_config = ClinicConfig()
+
+def simulate_heart_specialist(config=default_config, simulation_days=200, rng=None):
+    # Uniforms from the given numpy Generator, or the legacy global RNG
+    uniform = np.random.random if rng is None else rng.random
+
+    patients_per_day = config.patients_per_day
+    service_time_scheduled = config.service_time_scheduled
+    start_time = config.start_time
+    arrival_dist = discrete_distribution(config.arrival_times, config.arrival_probabilities)
+    service_dist = discrete_distribution(config.service_times, config.service_probabilities)
     
     # Statistics tracking
     total_patients = patients_per_day * simulation_days
@@ -35,11 +57,11 @@ def simulate_heart_specialist():
             scheduled_time = start_time + patient * service_time_scheduled
             
             # Determine actual arrival time (apply offset based on distribution)
-            arrival_offset = np.random.choice(arrival_times, p=arrival_probabilities)
+            arrival_offset = arrival_dist.from_uniform(uniform())
             actual_arrival = scheduled_time + arrival_offset
             
             # Determine service duration for this patient
-            service_duration = np.random.choice(service_times, p=service_probabilities)
+            service_duration = service_dist.from_uniform(uniform())
             
             # Calculate when patient can start being served
             start_service_time = max(actual_arrival, doctor_free_time)
@@ -72,15 +94,207 @@ def simulate_heart_specialist():
         "doctor_utilization": doctor_utilization
     }
 
+def _simulate_block(m, rng, config, draw_width):
+    # Simulate m clinic days at once; returns per-day arrays of
+    # (patients not waiting, last patient not waiting, busy time, day length)
+    patients_per_day = config.patients_per_day
+    start_time = config.start_time
+    scheduled_times = start_time + np.arange(patients_per_day) * config.service_time_scheduled
+
+    # Pre-draw the whole block
+    with profiling.phase("rng"):
+        u_arrival = rng.random((m, draw_width))[:, :patients_per_day]
+        u_service = rng.random((m, draw_width))[:, :patients_per_day]
+        arrivals = scheduled_times + discrete_distribution(
+            config.arrival_times, config.arrival_probabilities).from_uniform(u_arrival)
+        durations = discrete_distribution(
+            config.service_times, config.service_probabilities).from_uniform(u_service)
+    profiling.count("days", m)
+
+    with profiling.phase("simulate"):
+        # Compiled recursion when numba is installed
+        if HAVE_NUMBA:
+            return clinic_recursion(arrivals, durations, start_time)
+
+        # Waiting-time recursion, one patient at a time across all days
+        not_waiting_count = np.zeros(m, dtype=np.int64)
+        doctor_free_time = np.full(m, start_time)
+        for patient in range(patients_per_day):
+            start_service_time = np.maximum(arrivals[:, patient], doctor_free_time)
+            not_waiting = start_service_time <= arrivals[:, patient]
+            not_waiting_count += not_waiting
+            doctor_free_time = start_service_time + durations[:, patient]
+
+        return not_waiting_count, not_waiting, durations.sum(axis=1), doctor_free_time - start_time
+
+def simulate_heart_specialist_batch(simulation_days, rng=None, chunk_days=2**16,
+                                    config=default_config, draw_width=None):
+    """
+    Vectorized version of simulate_heart_specialist.
+
+    Arrival offsets and service times for a (days x patients) block are drawn
+    at once by inverse-CDF lookup, and the waiting-time (Lindley) recursion
+    runs over the patients of a day with all days of the block in parallel.
+    Returns the same three performance measures.
+
+    draw_width is the number of patient columns drawn per day (default:
+    config.patients_per_day). Configs run with the same seed and draw_width
+    see the same random numbers, which is how schedule candidates with
+    different patient counts share common random numbers.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if draw_width is None:
+        draw_width = config.patients_per_day
+
+    patients_not_waiting = 0
+    last_patients_not_waiting = 0
+    doctor_busy_time = 0
+    total_simulation_time = 0
+    days_done = 0
+
+    while days_done < simulation_days:
+        m = min(chunk_days, simulation_days - days_done)
+        not_waiting, last_not_waiting, busy, day_length = _simulate_block(m, rng, config, draw_width)
+        with profiling.phase("aggregate"):
+            patients_not_waiting += int(not_waiting.sum())
+            last_patients_not_waiting += int(last_not_waiting.sum())
+            doctor_busy_time += int(busy.sum())
+            total_simulation_time += int(day_length.sum())
+        days_done += m
+
+    return {
+        "probability_patient_not_wait": patients_not_waiting / (config.patients_per_day * simulation_days),
+        "probability_last_patient_not_wait": last_patients_not_waiting / simulation_days,
+        "doctor_utilization": doctor_busy_time / total_simulation_time
+    }
+
+def simulate_heart_specialist_until(target_half_width, rng=None, confidence=0.95,
+                                    block_days=10000, max_days=None, config=default_config):
+    """
+    Simulates clinic days in blocks until the confidence interval half-width
+    of the probability that a patient will not wait is at most
+    target_half_width. Memory use does not grow with the number of days.
+
+    Returns the three performance measures plus the number of simulated
+    days and the achieved half-width.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    def draw_daily_fractions():
+        not_waiting, last_not_waiting, busy, day_length = _simulate_block(
+            block_days, rng, config, config.patients_per_day)
+        last_stats.update_many(last_not_waiting)
+        busy_stats.update_many(busy)
+        length_stats.update_many(day_length)
+        return not_waiting / config.patients_per_day
+
+    last_stats = StreamingStats(quantile_k=None)
+    busy_stats = StreamingStats(quantile_k=None)
+    length_stats = StreamingStats(quantile_k=None)
+    not_wait_stats = run_until_precision(draw_daily_fractions, target_half_width,
+                                         confidence=confidence, method="iid",
+                                         min_count=block_days, max_count=max_days,
+                                         stats=StreamingStats(quantile_k=None))
+
+    return {
+        "probability_patient_not_wait": not_wait_stats.mean,
+        "probability_last_patient_not_wait": last_stats.mean,
+        "doctor_utilization": busy_stats.mean / length_stats.mean,
+        "days": not_wait_stats.count,
+        "half_width": not_wait_stats.half_width(confidence, method="iid")
+    }
+
+def simulate_heart_specialist_cached(config=default_config, simulation_days=200, seed=0,
+                                     batch=False, cache=None):
+    """
+    simulate_heart_specialist (or the batch version) with a numpy Generator
+    seeded by seed, cached on disk (result_cache.ResultCache, default
+    directory unless cache is given). The cache key covers the config, days,
+    engine, seed and the source of this module and its helpers.
+
+    Returns (results, True if they came from the cache).
+    """
+    from result_cache import ResultCache, code_version
+
+    if cache is None:
+        cache = ResultCache()
+
+    def compute():
+        rng = np.random.default_rng(seed)
+        if batch:
+            return simulate_heart_specialist_batch(simulation_days, rng, config=config)
+        return simulate_heart_specialist(config, simulation_days, rng)
+
+    params = {"config": config, "simulation_days": simulation_days, "batch": batch}
+    version = code_version(simulate_heart_specialist, discrete_distribution, clinic_recursion)
+    return cache.cached("heart_specialist.simulate_heart_specialist", params, seed, version, compute)
+
+def _evaluate_schedule(args):
+    # Worker: run one candidate schedule on the shared random number stream
+    config, simulation_days, seed, draw_width = args
+    rng = np.random.default_rng(seed)
+    return simulate_heart_specialist_batch(simulation_days, rng, config=config,
+                                           draw_width=draw_width)
+
+def optimize_schedule(appointment_intervals, patient_counts, simulation_days=10000,
+                      seed=1, wait_weight=0.5, base_config=default_config,
+                      max_workers=None):
+    """
+    Grid search over appointment intervals and patients per day.
+
+    Every candidate is simulated with the same seed (common random numbers)
+    and candidates are evaluated in parallel across CPU cores.
+
+    Parameters:
+    - appointment_intervals: candidate values of service_time_scheduled
+    - patient_counts: candidate values of patients_per_day
+    - simulation_days: number of days simulated per candidate
+    - seed: seed shared by all candidates
+    - wait_weight: weight of the no-wait probability in the score; the
+      remaining weight goes to doctor utilization
+    - base_config: config providing the remaining parameters
+    - max_workers: number of worker processes (default: all cores)
+
+    Returns:
+    - List of dicts, one per candidate, sorted by descending score
+    """
+    candidates = [replace(base_config, service_time_scheduled=interval, patients_per_day=count)
+                  for interval, count in itertools.product(appointment_intervals, patient_counts)]
+    draw_width = max(patient_counts)
+    tasks = [(config, simulation_days, seed, draw_width) for config in candidates]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        measures = list(executor.map(_evaluate_schedule, tasks))
+
+    rows = []
+    for config, result in zip(candidates, measures):
+        score = (wait_weight * result["probability_patient_not_wait"]
+                 + (1 - wait_weight) * result["doctor_utilization"])
+        rows.append({
+            "service_time_scheduled": config.service_time_scheduled,
+            "patients_per_day": config.patients_per_day,
+            **result,
+            "score": score
+        })
+    rows.sort(key=lambda row: row["score"], reverse=True)
+    return rows
+
 # Run the simulation and print results
 if __name__ == "__main__":
     np.random.seed(1)  # Set seed for reproducibility
     random.seed(1)
     
-    results = simulate_heart_specialist()
-    
-    print("Heart Specialist Clinic Simulation Results (200 days):")
-    print(f"a. Probability that a patient will not wait: {results['probability_patient_not_wait']:.4f}")
-    print(f"b. Probability that the last patient will not wait: {results['probability_last_patient_not_wait']:.4f}")
-    print(f"c. Utilization of the specialist: {results['doctor_utilization']:.4f}")
+    # Instrumented when MODEL_PROFILE is set
+    with profiling.session():
+        with profiling.phase("simulate"):
+            results = simulate_heart_specialist()
+        profiling.count("days", 200)
+        
+        with profiling.phase("report"):
+            print("Heart Specialist Clinic Simulation Results (200 days):")
+            print(f"a. Probability that a patient will not wait: {results['probability_patient_not_wait']:.4f}")
+            print(f"b. Probability that the last patient will not wait: {results['probability_last_patient_not_wait']:.4f}")
+            print(f"c. Utilization of the specialist: {results['doctor_utilization']:.4f}")
     
\ No newline at end of file
@@ -0,0 +1,114 @@
+import functools
+import importlib.util
+import numpy as np
+
+''' Compiled kernels for the queueing recurrences
+
+The clinic waiting-time recursion and the tanker dispatch loop are
+sequential in the customer index. When numba is installed these functions
+are compiled with njit; otherwise they run as plain Python and the models
+keep their NumPy/heap implementations (see HAVE_NUMBA).
+
+numba is imported, and each kernel compiled, on the kernel's first call,
+so importing the models stays cheap.
+
+'''
+
+# Checked without importing numba
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+
+
+def lazy_njit(func):
+    """
+    Compiles func with numba's njit(cache=True) on its first call, or
+    leaves it as plain Python without numba. The uncompiled function is
+    available as .py_func.
+    """
+    compiled = None
+
+    @functools.wraps(func)
+    def kernel(*args):
+        nonlocal compiled
+        if compiled is None:
+            if HAVE_NUMBA:
+                from numba import njit
+                compiled = njit(cache=True)(func)
+            else:
+                compiled = func
+        return compiled(*args)
+
+    kernel.py_func = func
+    return kernel
+
+
+@lazy_njit
+def clinic_recursion(arrivals, durations, start_time):
+    """
+    Waiting-time recursion for a (days x patients) block of arrival times
+    and service durations. The doctor is free at start_time every day.
+
+    Returns per-day arrays: number of patients not waiting, whether the last
+    patient did not wait, doctor busy time and day length.
+    """
+    days, patients = arrivals.shape
+    not_waiting = np.zeros(days, dtype=np.int64)
+    last_not_waiting = np.zeros(days, dtype=np.bool_)
+    busy = np.zeros(days, dtype=np.int64)
+    day_length = np.zeros(days, dtype=np.int64)
+
+    for day in range(days):
+        doctor_free_time = start_time
+        for patient in range(patients):
+            arrival = arrivals[day, patient]
+            start_service_time = max(arrival, doctor_free_time)
+            if start_service_time <= arrival:
+                not_waiting[day] += 1
+                if patient == patients - 1:
+                    last_not_waiting[day] = True
+            doctor_free_time = start_service_time + durations[day, patient]
+            busy[day] += durations[day, patient]
+        day_length[day] = doctor_free_time - start_time
+
+    return not_waiting, last_not_waiting, busy, day_length
+
+
+@lazy_njit
+def dispatch_tankers(arrival, size, durations, next_free):
+    """
+    Tanker dispatch loop. Terminals are indexed in order of preference: a
+    tanker goes to the most preferred terminal free at its arrival, otherwise
+    to the one that becomes free soonest (ties to the preferred terminal).
+
+    durations[size, terminal] holds unload days; next_free (one entry per
+    terminal) is updated in place so consecutive blocks can be chained.
+    Returns start, departure and terminal index arrays.
+    """
+    n = len(arrival)
+    k = len(next_free)
+    start = np.empty(n, dtype=np.int64)
+    departure = np.empty(n, dtype=np.int64)
+    terminal = np.empty(n, dtype=np.int16)
+
+    for i in range(n):
+        arrival_time = arrival[i]
+        chosen = -1
+        for t in range(k):
+            if next_free[t] <= arrival_time:
+                chosen = t
+                break
+        if chosen >= 0:
+            start_time = arrival_time
+        else:
+            chosen = 0
+            for t in range(1, k):
+                if next_free[t] < next_free[chosen]:
+                    chosen = t
+            start_time = next_free[chosen]
+
+        departure_time = start_time + durations[size[i], chosen]
+        next_free[chosen] = departure_time
+        start[i] = start_time
+        departure[i] = departure_time
+        terminal[i] = chosen
+
+    return start, departure, terminal
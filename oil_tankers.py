@@ -1,5 +1,11 @@
+import argparse
 import random
-import pandas as pd
+import numpy as np
+
+import profiling
+from discrete_dist import DiscreteDistribution
+from port_engine import EventLogWriter, PortMetrics, events_dataframe
+from streaming_stats import StreamingStats
 
 ''' A and B terminals
 
@@ -7,10 +13,17 @@ B is more efficient than A therefore is preferred
 
 '''
 
-random.seed(90345)  # For reproducibility
-
 tankers_to_simulate = 10
 
+# Seed of the global random module used by the script
+seed = 90345  # For reproducibility
+
+# Optional sequential stopping: stop once the confidence interval half-width
+# of the mean days in port (batch means) is at most this value, with
+# tankers_to_simulate as the upper limit. None always runs all tankers.
+target_half_width = None
+min_tankers = 1000
+
 # Define the number of days for unloading by tanker size at each terminal
 unload_times = {
     "supertanker": {"A": 4, "B": 3},
@@ -18,197 +31,227 @@ unload_times = {
     "small": {"A": 2, "B": 1}
 }
 
-# Lists to hold tanker simulation events
-# Each event is a dict with keys: arrival, start, departure, terminal
-events = []
-
-# Next available times for each terminal
-next_free = {"A": 0, "B": 0}
-
-# Current simulation time initialized to zero
-current_time = 0
-
-# Generate arrivals and assign terminals
-for i in range(tankers_to_simulate):
-    # Generate random numbers for interarrival time and tanker size selection
-    prob1 = random.random()
-    prob2 = random.random()
-
-    # Determine interarrival time (IAT)
-    if 0 <= prob1 <= 0.30:
-        iat = 2
-    elif 0.30 < prob1 <= 0.50:
-        iat = 3
-    elif 0.50 < prob1 <= 0.60:
-        iat = 4
-    elif 0.60 < prob1 <= 0.75:
-        iat = 5
-    elif 0.75 < prob1 <= 1:
-        iat = 6
-
-    # Update current time with interarrival time
-    arrival_time = current_time + iat
-    current_time = arrival_time
-
-    # Determine tanker size
-    if 0 <= prob2 <= 0.20:
-        tanker_size = "supertanker"
-    elif 0.20 < prob2 <= 0.65:
-        tanker_size = "midsize"
-    elif 0.65 < prob2 <= 1:
-        tanker_size = "small"
-
-    # Decide which terminal will process the tanker
-    # Prefer terminal B when available at the time of arrival.
-    if arrival_time >= next_free["B"]:
-        terminal = "B"
-        start_time = arrival_time
-    elif arrival_time >= next_free["A"]:
-        terminal = "A"
-        start_time = arrival_time
-    else:
-        # Both terminals are busy.
-        # Assign the tanker to whichever terminal becomes free sooner.
-        if next_free["B"] <= next_free["A"]:
+# Interarrival time (days) and tanker size distributions
+# (cumulative probabilities as upper bounds)
+iat_dist = DiscreteDistribution.from_cumulative([2, 3, 4, 5, 6], [0.30, 0.50, 0.60, 0.75, 1.00])
+size_dist = DiscreteDistribution.from_cumulative(["supertanker", "midsize", "small"], [0.20, 0.65, 1.00])
+
+# Optional chunked event log for long runs (requires pyarrow), e.g.
+# "tankers.parquet" or "tankers.feather"; written every output_chunk_size tankers
+output_path = None
+output_chunk_size = 1_000_000
+
+# Columnar event log: one preallocated array per field, filled in place.
+# Terminals and tanker sizes are stored as codes into these label lists.
+terminal_names = ["A", "B"]
+size_names = ["supertanker", "midsize", "small"]
+terminal_codes = {name: code for code, name in enumerate(terminal_names)}
+size_codes = {name: code for code, name in enumerate(size_names)}
+
+def simulate_tankers(tankers_to_simulate=tankers_to_simulate, rng=None,
+                     target_half_width=target_half_width, min_tankers=min_tankers,
+                     output_path=output_path, output_chunk_size=output_chunk_size):
+    """
+    Simulates tanker arrivals at terminals A and B (B preferred).
+
+    Parameters:
+    - tankers_to_simulate: number of tankers (upper limit with a stopping rule)
+    - rng: numpy Generator (default: the global random module)
+    - target_half_width, min_tankers: optional sequential stopping rule
+    - output_path, output_chunk_size: optional chunked event log; the logs
+      are then a buffer of output_chunk_size rows reused for every chunk
+
+    Returns:
+    - Dict with the event arrays 'arrival', 'start', 'departure', 'terminal'
+      and 'size' (codes into terminal_names and size_names), the PortMetrics
+      as 'metrics' and the days-in-port StreamingStats as 'port_time_stats'.
+      With output_path the arrays hold only the last chunk, which starts at
+      tanker 'log_start' (the full log is in the file).
+    """
+    # Uniforms from the given numpy Generator, or the global random module
+    uniform = random.random if rng is None else rng.random
+
+    event_writer = EventLogWriter(output_path) if output_path else None
+    # Rows held in memory: every tanker, or one chunk when writing chunks
+    buffer_size = tankers_to_simulate if event_writer is None else min(tankers_to_simulate, output_chunk_size)
+
+    arrival_log = np.empty(buffer_size, dtype=np.int64)
+    start_log = np.empty(buffer_size, dtype=np.int64)
+    departure_log = np.empty(buffer_size, dtype=np.int64)
+    terminal_log = np.empty(buffer_size, dtype=np.int8)
+    size_log = np.empty(buffer_size, dtype=np.int8)
+
+    # Statistics accumulated while simulating
+    metrics = PortMetrics(terminal_names, size_names)
+
+    # Tankers written so far; tanker i is logged in row i - written
+    written = 0
+
+    def write_events(end):
+        # Write the events logged since the last chunk (buffer rows 0 .. end - written)
+        nonlocal written
+        rows = end - written
+        event_writer.write(events_dataframe(
+            arrival_log[:rows], start_log[:rows], departure_log[:rows],
+            terminal_log[:rows], size_log[:rows], terminal_names, size_names))
+        written = end
+
+    # Next available times for each terminal
+    next_free = {"A": 0, "B": 0}
+
+    # Current simulation time initialized to zero
+    current_time = 0
+
+    # Streaming statistics of days in port (constant memory)
+    port_time_stats = StreamingStats(quantile_k=None)
+
+    # Generate arrivals and assign terminals
+    for i in range(tankers_to_simulate):
+        # Generate random numbers for interarrival time and tanker size selection
+        prob1 = uniform()
+        prob2 = uniform()
+
+        # Determine interarrival time (IAT)
+        iat = iat_dist.from_uniform(prob1)
+
+        # Update current time with interarrival time
+        arrival_time = current_time + iat
+        current_time = arrival_time
+
+        # Determine tanker size
+        tanker_size = size_dist.from_uniform(prob2)
+
+        # Decide which terminal will process the tanker
+        # Prefer terminal B when available at the time of arrival.
+        if arrival_time >= next_free["B"]:
             terminal = "B"
-            start_time = next_free["B"]
-        else:
+            start_time = arrival_time
+        elif arrival_time >= next_free["A"]:
             terminal = "A"
-            start_time = next_free["A"]
-
-    # Determine unload duration based on tanker size and terminal
-    duration = unload_times[tanker_size][terminal]
-    departure_time = start_time + duration
-
-    # Update terminal availability
-    next_free[terminal] = departure_time
-
-    # Record the event with tanker type information
-    events.append({
-        "arrival": arrival_time,
-        "start": start_time,
-        "departure": departure_time,
-        "terminal": terminal,
-        "tanker_size": tanker_size
-    })
-
-# Determine final simulation time (last departure)
-sim_end = max(event["departure"] for event in events)
-
-# Now, calculate the average occupancy at each terminal.
-# We will simulate time changes at each event (arrival, start, departure)
-# and compute occupancy as a piecewise constant function.
-# We'll build a list of time points with changes in occupancy for each terminal.
-time_changes = []
-for event in events:
-    # When a tanker starts unloading, it "enters" the terminal.
-    time_changes.append((event["start"], event["terminal"], +1))
-    # When it departs, it "leaves" the terminal.
-    time_changes.append((event["departure"], event["terminal"], -1))
-
-# Sort the time changes by time
-time_changes.sort(key=lambda x: x[0])
-
-# Occupancies
-occupancy = {"A": 0, "B": 0}
-# Total "occupancy-time" accumulated per terminal
-total_occupancy_time = {"A": 0, "B": 0}
-last_time = 0
-
-for time_point, term, change in time_changes:
-    # Calculate time elapsed since the last event
-    dt = time_point - last_time
-    # Accumulate occupancy-time for both terminals over dt
-    for t in ["A", "B"]:
-        total_occupancy_time[t] += occupancy[t] * dt
-    # Update occupancy for the terminal with the event
-    occupancy[term] += change
-    last_time = time_point
-
-# Calculate average occupancy = total occupancy-time divided by simulation end time
-avg_A = total_occupancy_time["A"] / sim_end
-avg_B = total_occupancy_time["B"] / sim_end
-
-# Count the number of tankers processed at each terminal
-num_tankers_A = sum(1 for event in events if event["terminal"] == "A")
-num_tankers_B = sum(1 for event in events if event["terminal"] == "B")
-
-print("\nNumber of tankers processed:")
-print(f"Terminal A: {num_tankers_A}")
-print(f"Terminal B: {num_tankers_B}")
-
-print("\nUtilization:")
-print(f"Terminal A: {avg_A:.2f}")
-print(f"Terminal B: {avg_B:.2f}")
-
-# Calculate the average number of days in port for each tanker type
-total_days_in_port = {}
-tanker_counts = {}
-
-for event in events:
-    tanker_type = event["tanker_size"]
-    # The days in port equals departure time minus arrival time
-    time_in_port = event["departure"] - event["arrival"]
-    total_days_in_port[tanker_type] = total_days_in_port.get(tanker_type, 0) + time_in_port
-    tanker_counts[tanker_type] = tanker_counts.get(tanker_type, 0) + 1
-
-print("\nAverage days in port per tanker type:")
-for tanker_type in total_days_in_port:
-    avg_days = total_days_in_port[tanker_type] / tanker_counts[tanker_type]
-    print(f"{tanker_type}: {avg_days:.2f}")
-
-# Calculate the average number of days in queue by terminal
-total_queue_time = {"A": 0, "B": 0}
-for event in events:
-    terminal = event["terminal"]
-    # Queue time is the time between arrival and start of service
-    queue_time = event["start"] - event["arrival"]
-    total_queue_time[terminal] += queue_time
-
-# Calculate and print average queue time by terminal
-print("\nAverage days in queue by terminal:")
-if num_tankers_A > 0:
-    avg_queue_A = total_queue_time["A"] / num_tankers_A
-    print(f"Terminal A: {avg_queue_A:.2f}")
-else:
-    print("Terminal A: N/A (no tankers processed)")
-    
-if num_tankers_B > 0:
-    avg_queue_B = total_queue_time["B"] / num_tankers_B
-    print(f"Terminal B: {avg_queue_B:.2f}")
-else:
-    print("Terminal B: N/A (no tankers processed)")
-
-# Create pandas DataFrame with required information
-tanker_data = []
-for i, event in enumerate(events):
-    tanker_id = i + 1
-    tanker_type = event["tanker_size"]
-    arrival_time = event["arrival"]
-    start_time = event["start"]
-    departure_time = event["departure"]
-    terminal = event["terminal"]
-    time_in_port = departure_time - arrival_time
-    time_in_queue = start_time - arrival_time
-    service_time = departure_time - start_time
-    
-    tanker_data.append({
-        # "Tanker ID": tanker_id,
-        "Tanker Type": tanker_type,
-        "Arrival Time": arrival_time,
-        "Start Time": start_time,
-        "Departure Time": departure_time,
-        "Terminal": terminal,
-        "Time in Port": time_in_port,
-        "Time in Queue": time_in_queue,
-        "Service Time": service_time
-    })
-
-# Create the DataFrame
-df = pd.DataFrame(tanker_data)
-
-print("\nTanker Information Table:")
-pd.set_option('display.max_columns', None)
-pd.set_option('display.width', None)
-pd.set_option('display.precision', 2)
-print(df)
+            start_time = arrival_time
+        else:
+            # Both terminals are busy.
+            # Assign the tanker to whichever terminal becomes free sooner.
+            if next_free["B"] <= next_free["A"]:
+                terminal = "B"
+                start_time = next_free["B"]
+            else:
+                terminal = "A"
+                start_time = next_free["A"]
+
+        # Determine unload duration based on tanker size and terminal
+        duration = unload_times[tanker_size][terminal]
+        departure_time = start_time + duration
+
+        # Update terminal availability
+        next_free[terminal] = departure_time
+
+        # Record the event with tanker type information
+        row = i - written
+        arrival_log[row] = arrival_time
+        start_log[row] = start_time
+        departure_log[row] = departure_time
+        terminal_log[row] = terminal_codes[terminal]
+        size_log[row] = size_codes[tanker_size]
+        metrics.record(arrival_time, start_time, departure_time, terminal, tanker_size)
+
+        if event_writer is not None and i + 1 - written == output_chunk_size:
+            write_events(i + 1)
+
+        # Check the stopping rule
+        port_time_stats.update(departure_time - arrival_time)
+        if (target_half_width is not None and port_time_stats.count >= min_tankers
+                and port_time_stats.half_width() <= target_half_width):
+            break
+
+    # Keep only the logged rows (views, no copy)
+    num_simulated = port_time_stats.count
+    kept = num_simulated - written
+    if kept == 0 and written:
+        # Stopped at a chunk boundary: the buffer still holds the last chunk
+        kept = min(buffer_size, written)
+    log_start = num_simulated - kept
+
+    if event_writer is not None:
+        if written < num_simulated:
+            write_events(num_simulated)
+        event_writer.close()
+
+    return {
+        "arrival": arrival_log[:kept],
+        "start": start_log[:kept],
+        "departure": departure_log[:kept],
+        "terminal": terminal_log[:kept],
+        "size": size_log[:kept],
+        "log_start": log_start,
+        "metrics": metrics,
+        "port_time_stats": port_time_stats
+    }
+
+def print_report(result):
+    """Prints the port statistics and the tanker information table."""
+    import pandas as pd
+
+    metrics = result["metrics"]
+
+    # Average occupancy = total occupancy-time divided by simulation end time
+    utilization = metrics.utilization()
+
+    print("\nNumber of tankers processed:")
+    for t in terminal_names:
+        print(f"Terminal {t}: {metrics.tanker_counts[t]}")
+
+    print("\nUtilization:")
+    for t in terminal_names:
+        print(f"Terminal {t}: {utilization[t]:.2f}")
+
+    print("\nAverage days in port per tanker type:")
+    for tanker_type, avg_days in metrics.avg_days_in_port().items():
+        print(f"{tanker_type}: {avg_days:.2f}")
+
+    # Calculate and print average queue time by terminal
+    print("\nAverage days in queue by terminal:")
+    for t, avg_queue in metrics.avg_queue_time().items():
+        if avg_queue is not None:
+            print(f"Terminal {t}: {avg_queue:.2f}")
+        else:
+            print(f"Terminal {t}: N/A (no tankers processed)")
+
+    # Create the DataFrame directly from the event arrays
+    df = events_dataframe(result["arrival"], result["start"], result["departure"],
+                          result["terminal"], result["size"], terminal_names, size_names)
+
+    print("\nTanker Information Table:")
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.width', None)
+    pd.set_option('display.precision', 2)
+    print(df)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Oil tanker terminal simulation.")
+    parser.add_argument('--tankers', type=int, default=tankers_to_simulate,
+                        help="tankers to simulate (upper limit with --half-width)")
+    parser.add_argument('--seed', type=int, default=seed)
+    parser.add_argument('--half-width', type=float, default=target_half_width,
+                        help="stop once the days-in-port CI half-width is at most this")
+    parser.add_argument('--min-tankers', type=int, default=min_tankers)
+    parser.add_argument('--output', default=output_path,
+                        help="chunked event log (.parquet or .feather, requires pyarrow)")
+    parser.add_argument('--chunk-size', type=int, default=output_chunk_size)
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    with profiling.session(args.profile, args.profile_output):
+        # Draws, dispatch and statistics are interleaved per tanker, so they
+        # are timed together
+        with profiling.phase("simulate"):
+            result = simulate_tankers(args.tankers, target_half_width=args.half_width,
+                                      min_tankers=args.min_tankers, output_path=args.output,
+                                      output_chunk_size=args.chunk_size)
+        profiling.count("tankers", result["port_time_stats"].count)
+        with profiling.phase("report"):
+            print_report(result)
+
+if __name__ == "__main__":
+    main()
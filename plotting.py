@@ -0,0 +1,90 @@
+import numpy as np
+
+''' Report plotting helpers
+
+With an output path, figures are drawn on the Agg canvas without pyplot
+and saved to the file (the extension picks the format, e.g. .png or .svg),
+so reports render on machines without a display. Without one they are
+shown with pyplot as before.
+
+Histograms are binned here in chunks and only the bin heights are passed
+to matplotlib, so memory stays bounded for very large sample arrays.
+
+'''
+
+# Samples binned per np.histogram call
+histogram_chunk_size = 2**22
+
+
+def new_figure(figsize, output=None):
+    """New figure: headless on the Agg canvas if output is given, else pyplot."""
+    if output is None:
+        import matplotlib.pyplot as plt
+        return plt.figure(figsize=figsize)
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def finish_figure(fig, output=None, dpi=100):
+    """Lays out the figure and saves it to output, or shows it if output is None."""
+    fig.tight_layout()
+    if output is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+    else:
+        fig.savefig(output, dpi=dpi)
+
+
+def histogram_counts(samples, bins=30, value_range=None, chunk_size=None):
+    """
+    Counts of samples (array or memory map) in equal-width bins, accumulated
+    chunk by chunk. The range defaults to the sample minimum and maximum, as
+    in np.histogram.
+
+    Returns:
+    - (counts, bin edges)
+    """
+    if chunk_size is None:
+        chunk_size = histogram_chunk_size
+    samples = np.asarray(samples).ravel()
+    if value_range is None:
+        value_range = (float(samples.min()), float(samples.max()))
+
+    counts = np.zeros(bins, dtype=np.int64)
+    edges = None
+    for start in range(0, len(samples), chunk_size):
+        chunk_counts, edges = np.histogram(samples[start:start + chunk_size], bins, value_range)
+        counts += chunk_counts
+    if edges is None:
+        edges = np.histogram_bin_edges(samples, bins, value_range)
+    return counts, edges
+
+
+def plot_binned(ax, counts, edges, density=True, **kwargs):
+    """
+    Draws histogram bars from bin counts (keyword arguments go to ax.hist).
+
+    Returns:
+    - Bin heights
+    """
+    heights = np.asarray(counts, dtype=float)
+    if density and heights.sum():
+        heights = heights / (heights.sum() * np.diff(edges))
+    ax.hist(edges[:-1], bins=edges, weights=heights, **kwargs)
+    return heights
+
+
+def plot_histogram(ax, samples, bins=30, value_range=None, density=True, **kwargs):
+    """
+    ax.hist for large sample arrays: bins with histogram_counts and draws
+    the bars from the counts.
+
+    Returns:
+    - (bin heights, bin edges)
+    """
+    counts, edges = histogram_counts(samples, bins, value_range)
+    return plot_binned(ax, counts, edges, density, **kwargs), edges
@@ -0,0 +1,303 @@
+import heapq
+import numpy as np
+
+import profiling
+from discrete_dist import discrete_distribution_cumulative
+from kernels import HAVE_NUMBA, dispatch_tankers
+
+''' Port engine generalizing oil_tankers.py
+
+Any number of terminals, listed in order of preference, and per-size
+unload times for each terminal. A tanker goes to the most preferred
+terminal that is free when it arrives; if all are busy it waits for the
+terminal that becomes free soonest (ties go to the preferred terminal).
+
+'''
+
+# Number of days for unloading by tanker size at each terminal
+default_unload_times = {
+    "supertanker": {"A": 4, "B": 3},
+    "midsize": {"A": 3, "B": 2},
+    "small": {"A": 2, "B": 1}
+}
+
+# Interarrival time distribution (days, cumulative probabilities as upper bounds)
+default_iat_values = (2, 3, 4, 5, 6)
+default_iat_cum_probs = (0.30, 0.50, 0.60, 0.75, 1.00)
+
+# Tanker size distribution
+default_sizes = ("supertanker", "midsize", "small")
+default_size_cum_probs = (0.20, 0.65, 1.00)
+
+
+class PortMetrics:
+    """
+    Port statistics accumulated in one pass while tankers are simulated.
+
+    A terminal serves one tanker at a time, so its time-weighted occupancy
+    is its total service time divided by the simulation end (the last
+    departure); no sorted list of occupancy changes is needed.
+    """
+
+    def __init__(self, terminals, sizes):
+        self.terminals = list(terminals)
+        self.sizes = list(sizes)
+        self.sim_end = 0
+
+        # Per terminal
+        self.tanker_counts = {t: 0 for t in self.terminals}
+        self.busy_time = {t: 0 for t in self.terminals}
+        self.queue_time = {t: 0 for t in self.terminals}
+
+        # Per tanker size, in order of first appearance
+        self.size_counts = {}
+        self.days_in_port = {}
+
+    def record(self, arrival, start, departure, terminal, size):
+        """Adds one tanker (terminal and size given by label)."""
+        self.sim_end = max(self.sim_end, departure)
+        self.tanker_counts[terminal] += 1
+        self.busy_time[terminal] += departure - start
+        self.queue_time[terminal] += start - arrival
+        self.size_counts[size] = self.size_counts.get(size, 0) + 1
+        self.days_in_port[size] = self.days_in_port.get(size, 0) + departure - arrival
+
+    def record_many(self, arrival, start, departure, terminal, size):
+        """Adds a block of tankers (terminal and size given as code arrays)."""
+        if len(arrival) == 0:
+            return
+        self.sim_end = max(self.sim_end, int(departure.max()))
+
+        k = len(self.terminals)
+        counts = np.bincount(terminal, minlength=k)
+        busy = np.bincount(terminal, weights=departure - start, minlength=k)
+        queue = np.bincount(terminal, weights=start - arrival, minlength=k)
+        for code, t in enumerate(self.terminals):
+            self.tanker_counts[t] += int(counts[code])
+            self.busy_time[t] += int(busy[code])
+            self.queue_time[t] += int(queue[code])
+
+        size_counts = np.bincount(size, minlength=len(self.sizes))
+        port_time = np.bincount(size, weights=departure - arrival, minlength=len(self.sizes))
+        present, first_seen = np.unique(size, return_index=True)
+        for code in present[np.argsort(first_seen)]:
+            s = self.sizes[code]
+            self.size_counts[s] = self.size_counts.get(s, 0) + int(size_counts[code])
+            self.days_in_port[s] = self.days_in_port.get(s, 0) + int(port_time[code])
+
+    def utilization(self):
+        """Average occupancy of each terminal over [0, last departure]."""
+        return {t: self.busy_time[t] / self.sim_end if self.sim_end else 0.0
+                for t in self.terminals}
+
+    def avg_days_in_port(self):
+        """Average days in port per tanker size."""
+        return {s: self.days_in_port[s] / self.size_counts[s] for s in self.size_counts}
+
+    def avg_queue_time(self):
+        """Average days in queue per terminal (None if it served no tankers)."""
+        return {t: self.queue_time[t] / self.tanker_counts[t] if self.tanker_counts[t] else None
+                for t in self.terminals}
+
+
+def simulate_port(num_tankers, terminals=("B", "A"), unload_times=default_unload_times,
+                  iat_values=default_iat_values, iat_cum_probs=default_iat_cum_probs,
+                  sizes=default_sizes, size_cum_probs=default_size_cum_probs,
+                  rng=None, chunk_size=2**16, use_kernel=None):
+    """
+    Simulates num_tankers tanker arrivals at a port.
+
+    The event calendar is a heap of terminal release (departure) events keyed
+    by (time, preference), so each arrival is dispatched in O(log k) for k
+    terminals. Interarrival times and sizes are drawn in blocks of chunk_size.
+    With use_kernel (default: when numba is installed) each block is
+    dispatched by the compiled kernels.dispatch_tankers instead, which scans
+    the terminals linearly and gives the same assignments.
+
+    Parameters:
+    - num_tankers: number of tanker arrivals to simulate
+    - terminals: terminal names in order of preference
+    - unload_times: dict size -> dict terminal -> unload days
+    - iat_values, iat_cum_probs: interarrival time table
+    - sizes, size_cum_probs: tanker size table
+    - rng: numpy Generator (default: a fresh default_rng())
+
+    Returns:
+    - Dict of arrays 'arrival', 'start', 'departure', 'terminal' (index into
+      terminals) and 'size' (index into sizes), the label tuples
+      'terminals' and 'sizes', and the PortMetrics of the run as 'metrics'
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    iat_dist = discrete_distribution_cumulative(tuple(iat_values), tuple(iat_cum_probs))
+    size_dist = discrete_distribution_cumulative(tuple(range(len(sizes))), tuple(size_cum_probs))
+    # Unload days indexed by [size, terminal]
+    durations = np.array([[unload_times[size][t] for t in terminals] for size in sizes])
+
+    arrival = np.empty(num_tankers, dtype=np.int64)
+    start = np.empty(num_tankers, dtype=np.int64)
+    departure = np.empty(num_tankers, dtype=np.int64)
+    terminal = np.empty(num_tankers, dtype=np.int16)
+    size = np.empty(num_tankers, dtype=np.int16)
+    metrics = PortMetrics(terminals, sizes)
+
+    if use_kernel is None:
+        use_kernel = HAVE_NUMBA
+    # Next free time per terminal for the compiled kernel
+    next_free = np.zeros(len(terminals), dtype=np.int64)
+
+    # Event calendar: (time the terminal becomes free, preference index)
+    busy = [(0, k) for k in range(len(terminals))]
+    heapq.heapify(busy)
+    # Terminals already free at the current arrival, by preference
+    idle = []
+
+    current_time = 0
+    done = 0
+    while done < num_tankers:
+        m = min(chunk_size, num_tankers - done)
+
+        # Draw the block of interarrival times and sizes
+        with profiling.phase("rng"):
+            iat = iat_dist.sample(m, rng)
+            block_arrival = current_time + np.cumsum(iat)
+            block_size = size_dist.sample(m, rng)
+        current_time = int(block_arrival[-1])
+        profiling.count("tankers", m)
+
+        arrival[done:done + m] = block_arrival
+        size[done:done + m] = block_size
+        block = slice(done, done + m)
+
+        with profiling.phase("simulate"):
+            if use_kernel:
+                start[block], departure[block], terminal[block] = dispatch_tankers(
+                    block_arrival, block_size, durations, next_free)
+            else:
+                block_durations = durations[block_size].tolist()
+                for i, arrival_time in enumerate(block_arrival.tolist()):
+                    # Release every terminal that is free by the arrival time
+                    while busy and busy[0][0] <= arrival_time:
+                        heapq.heappush(idle, heapq.heappop(busy)[1])
+
+                    if idle:
+                        k = heapq.heappop(idle)
+                        start_time = arrival_time
+                    else:
+                        start_time, k = heapq.heappop(busy)
+
+                    departure_time = start_time + block_durations[i][k]
+                    heapq.heappush(busy, (departure_time, k))
+
+                    start[done + i] = start_time
+                    departure[done + i] = departure_time
+                    terminal[done + i] = k
+
+        with profiling.phase("aggregate"):
+            metrics.record_many(arrival[block], start[block], departure[block], terminal[block], size[block])
+        done += m
+
+    return {
+        "arrival": arrival,
+        "start": start,
+        "departure": departure,
+        "terminal": terminal,
+        "size": size,
+        "terminals": tuple(terminals),
+        "sizes": tuple(sizes),
+        "metrics": metrics
+    }
+
+
+def events_dataframe(arrival, start, departure, terminal, size, terminals, sizes):
+    """
+    Builds the tanker information table from columnar event arrays.
+
+    The time columns are used without copying and terminal/size codes become
+    categoricals over their label lists, so no per-row Python objects are
+    created.
+    """
+    import pandas as pd
+
+    return pd.DataFrame({
+        "Tanker Type": pd.Categorical.from_codes(size, categories=list(sizes)),
+        "Arrival Time": arrival,
+        "Start Time": start,
+        "Departure Time": departure,
+        "Terminal": pd.Categorical.from_codes(terminal, categories=list(terminals)),
+        "Time in Port": departure - arrival,
+        "Time in Queue": start - arrival,
+        "Service Time": departure - start
+    }, copy=False)
+
+
+def to_dataframe(result):
+    """Tanker information table for the output of simulate_port."""
+    return events_dataframe(result["arrival"], result["start"], result["departure"],
+                            result["terminal"], result["size"],
+                            result["terminals"], result["sizes"])
+
+
+class EventLogWriter:
+    """
+    Writes an event log in chunks, for runs too long to keep as one table.
+
+    Parquet output is a single file with one row group per chunk; Feather
+    output is one file per chunk (<stem>_00000.feather, ...). Requires pyarrow.
+    """
+
+    def __init__(self, path, file_format=None):
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError("chunked event log output requires pyarrow (pip install pyarrow)") from e
+
+        if file_format is None:
+            file_format = "feather" if path.endswith((".feather", ".arrow")) else "parquet"
+        if file_format not in ("parquet", "feather"):
+            raise ValueError(f"unknown event log format: {file_format}")
+
+        self.path = path
+        self.file_format = file_format
+        self.chunks_written = 0
+        self._pyarrow = pyarrow
+        self._parquet_writer = None
+
+    def write(self, df):
+        table = self._pyarrow.Table.from_pandas(df, preserve_index=False)
+        if self.file_format == "parquet":
+            import pyarrow.parquet as pq
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            import pyarrow.feather as feather
+            stem, dot, ext = self.path.rpartition(".")
+            feather.write_feather(table, f"{stem}_{self.chunks_written:05d}.{ext}")
+        self.chunks_written += 1
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def simulate_port_summary(num_tankers, rng=None, **kwargs):
+    """
+    Runs simulate_port and returns only its summary measures (utilization
+    and average queue time per terminal, average days in port per size),
+    e.g. for replication runners that should not ship the event arrays.
+    """
+    metrics = simulate_port(num_tankers, rng=rng, **kwargs)["metrics"]
+    return {
+        "utilization": metrics.utilization(),
+        "avg_queue_time": metrics.avg_queue_time(),
+        "avg_days_in_port": metrics.avg_days_in_port()
+    }
@@ -0,0 +1,191 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+''' Opt-in run instrumentation
+
+The models mark their phases (random draws "rng", the model recursion
+"simulate", statistics "aggregate", tables and plots "report") with
+
+    with profiling.phase("simulate"):
+        ...
+
+and count work with profiling.count("days", m). Both do nothing unless a
+session is active, so the hooks stay in the code. A session also can run
+cProfile or pyinstrument around the whole run and prints a summary (or
+writes it as JSON) at the end. The model scripts start one with --profile,
+or with the MODEL_PROFILE environment variable (timers, cprofile or
+pyinstrument) when the code cannot be changed.
+
+Phase times are inclusive: a phase entered inside another counts in both.
+
+'''
+
+profile_modes = ("timers", "cprofile", "pyinstrument")
+
+# Active Profiler, or None when instrumentation is off
+_active = None
+_null_phase = nullcontext()
+
+
+class Profiler:
+    """
+    Phase timers and counters for one run, optionally with a cProfile or
+    pyinstrument profile of the whole run (mode).
+    """
+
+    def __init__(self, mode="timers", top=25):
+        if mode not in profile_modes:
+            raise ValueError(f"unknown profile mode: {mode}")
+        self.mode = mode
+        self.top = top
+        self.phases = {}
+        self.counters = {}
+        self.wall_seconds = 0.0
+        self._started = None
+        self._backend = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self.phases.setdefault(name, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def start(self):
+        if self.mode == "cprofile":
+            import cProfile
+            self._backend = cProfile.Profile()
+            self._backend.enable()
+        elif self.mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as PyinstrumentProfiler
+            except ImportError as e:
+                raise ImportError("--profile pyinstrument requires pyinstrument (pip install pyinstrument)") from e
+            self._backend = PyinstrumentProfiler()
+            self._backend.start()
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self.wall_seconds += time.perf_counter() - self._started
+        if self.mode == "cprofile":
+            self._backend.disable()
+        elif self.mode == "pyinstrument":
+            self._backend.stop()
+
+    def summary(self):
+        """
+        Structured summary: wall time, per-phase seconds, calls and share
+        of the wall time, counters, counter rates per second of wall time
+        and, with cProfile, the top functions by cumulative time.
+        """
+        wall = self.wall_seconds
+        summary = {
+            "mode": self.mode,
+            "wall_seconds": wall,
+            "phases": {name: {"seconds": seconds, "calls": calls,
+                              "share": seconds / wall if wall else None}
+                       for name, (seconds, calls) in self.phases.items()},
+            "counters": dict(self.counters),
+            "rates": {name: n / wall for name, n in self.counters.items()} if wall else {}
+        }
+        if self.mode == "cprofile":
+            summary["functions"] = self._top_functions()
+        return summary
+
+    def _top_functions(self):
+        import pstats
+        stats = pstats.Stats(self._backend)
+        rows = []
+        for (filename, line, function), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{line}({function})",
+                "calls": ncalls,
+                "tottime": tottime,
+                "cumtime": cumtime
+            })
+        rows.sort(key=lambda row: row["cumtime"], reverse=True)
+        return rows[:self.top]
+
+    def print_summary(self, file=None):
+        file = sys.stderr if file is None else file
+        summary = self.summary()
+        print(f"\nProfile summary ({self.mode}): {summary['wall_seconds']:.4f} s wall time", file=file)
+        if summary["phases"]:
+            print(f"{'Phase':20} {'Seconds':>10} {'Calls':>10} {'Share':>8}", file=file)
+            for name, p in sorted(summary["phases"].items(), key=lambda item: -item[1]["seconds"]):
+                share = f"{p['share'] * 100:7.1f}%" if p["share"] is not None else ""
+                print(f"{name:20} {p['seconds']:10.4f} {p['calls']:10d} {share:>8}", file=file)
+        for name, n in summary["counters"].items():
+            rate = summary["rates"].get(name)
+            print(f"{name}: {n:,}" + (f" ({rate:,.0f}/s)" if rate else ""), file=file)
+        if self.mode == "cprofile":
+            print(f"\n{'Function':60} {'Calls':>10} {'Tottime':>10} {'Cumtime':>10}", file=file)
+            for row in summary["functions"]:
+                print(f"{row['function'][:60]:60} {row['calls']:10d} {row['tottime']:10.4f} "
+                      f"{row['cumtime']:10.4f}", file=file)
+        elif self.mode == "pyinstrument":
+            print(self._backend.output_text(unicode=False, color=False), file=file)
+
+
+def phase(name):
+    """Times the enclosed block as phase name in the active session, if any."""
+    if _active is None:
+        return _null_phase
+    return _active.phase(name)
+
+
+def count(name, n=1):
+    """Adds n to counter name in the active session, if any."""
+    if _active is not None:
+        _active.count(name, n)
+
+
+def active():
+    """The active Profiler, or None."""
+    return _active
+
+
+@contextmanager
+def session(mode=None, output=None):
+    """
+    Instruments the enclosed run. mode is None (off, unless MODEL_PROFILE
+    is set), "timers", "cprofile" or "pyinstrument". At the end the summary
+    is printed to stderr, and written as JSON to output if given.
+    """
+    global _active
+    if mode is None:
+        mode = os.environ.get("MODEL_PROFILE") or None
+    if mode is None or _active is not None:
+        # Off, or nested in a session that is already running
+        yield _active
+        return
+
+    profiler = Profiler(mode)
+    profiler.start()
+    _active = profiler
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active = None
+        profiler.print_summary()
+        if output:
+            with open(output, 'w') as f:
+                json.dump(profiler.summary(), f, indent=2)
+
+
+def add_arguments(parser):
+    """Adds --profile and --profile-output to an argparse parser."""
+    parser.add_argument('--profile', nargs='?', const='timers', choices=profile_modes,
+                        help="instrument the run: phase timers (default), cprofile or pyinstrument")
+    parser.add_argument('--profile-output', help="write the profile summary as JSON to this file")
@@ -0,0 +1,143 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from streaming_stats import StreamingStats
+
+''' Independent random number streams for replications
+
+Every replication gets its own numpy Generator spawned from one
+SeedSequence, by replication index. The streams are statistically
+independent and do not depend on how replications are spread over
+workers, so results are bit-reproducible for any worker count.
+
+'''
+
+
+def spawn_seeds(seed, n):
+    """n independent child SeedSequences of seed (an int, None or a SeedSequence)."""
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+def spawn_generators(seed, n):
+    """n independent numpy Generators spawned from seed."""
+    return [np.random.default_rng(s) for s in spawn_seeds(seed, n)]
+
+
+def _run_replication(args):
+    # Worker: run one replication on its own child stream
+    func, child_seed, kwargs = args
+    return func(rng=np.random.default_rng(child_seed), **kwargs)
+
+
+def run_replications(func, num_replications, seed=None, max_workers=1, **kwargs):
+    """
+    Runs func(rng=<Generator>, **kwargs) once per replication.
+
+    Parameters:
+    - func: module-level function accepting an rng keyword (picklable)
+    - num_replications: number of replications
+    - seed: root seed; replication i always gets the i-th child stream
+    - max_workers: number of worker processes (1 runs in this process,
+      None uses all cores)
+    - kwargs: further keyword arguments for func
+
+    Returns:
+    - List of the replication results, in replication order
+    """
+    tasks = [(func, child, kwargs) for child in spawn_seeds(seed, num_replications)]
+    if max_workers == 1:
+        return [_run_replication(task) for task in tasks]
+
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, num_replications // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_run_replication, tasks, chunksize=chunksize))
+
+
+def _flatten(result, prefix=()):
+    # Flatten nested dicts of measures into {key tuple or name: value}
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + (key,)))
+        elif value is not None:
+            flat[prefix + (key,) if prefix else key] = value
+    return flat
+
+
+def _run_shard(args):
+    # Worker: run a contiguous range of replications and summarize them
+    # in streaming accumulators, so only the statistics are sent back
+    func, child_seeds, kwargs, quantile_k = args
+    started = time.perf_counter()
+    stats = {}
+    for child_seed in child_seeds:
+        result = _flatten(func(rng=np.random.default_rng(child_seed), **kwargs))
+        for key, value in result.items():
+            if key not in stats:
+                stats[key] = StreamingStats(quantile_k=quantile_k)
+            stats[key].update(float(value))
+    return stats, os.getpid(), len(child_seeds), time.perf_counter() - started
+
+
+def run_sharded(func, num_replications, seed=None, max_workers=None, shard_size=None,
+                quantile_k=None, **kwargs):
+    """
+    Runs replications in shards across a process pool and merges their
+    statistics.
+
+    func(rng=<Generator>, **kwargs) must return a dict of scalar measures
+    (nested dicts are flattened to tuple keys). Each shard returns one
+    StreamingStats per measure instead of the raw replication results.
+    Shards have a fixed size and are merged in order, so the merged
+    statistics do not depend on the number of workers.
+
+    Parameters:
+    - func: module-level function accepting an rng keyword (picklable)
+    - num_replications: number of replications
+    - seed: root seed; replication i always gets the i-th child stream
+    - max_workers: number of worker processes (None uses all cores)
+    - shard_size: replications per shard (default: about 64 shards)
+    - quantile_k: quantile sketch size per measure (None disables quantiles)
+    - kwargs: further keyword arguments for func
+
+    Returns:
+    - Dict with 'stats' (measure -> StreamingStats), 'workers' (pid ->
+      replications, busy seconds and replications/sec), 'elapsed' (wall
+      seconds) and 'replications_per_sec' (overall)
+    """
+    if shard_size is None:
+        shard_size = max(1, -(-num_replications // 64))
+    seeds = spawn_seeds(seed, num_replications)
+    tasks = [(func, seeds[i:i + shard_size], kwargs, quantile_k)
+             for i in range(0, num_replications, shard_size)]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        shards = list(executor.map(_run_shard, tasks))
+    elapsed = time.perf_counter() - started
+
+    stats = {}
+    workers = {}
+    for shard_stats, pid, count, seconds in shards:
+        for key, acc in shard_stats.items():
+            if key not in stats:
+                stats[key] = acc
+            else:
+                stats[key].merge(acc)
+        worker = workers.setdefault(pid, {'replications': 0, 'seconds': 0.0})
+        worker['replications'] += count
+        worker['seconds'] += seconds
+    for worker in workers.values():
+        worker['replications_per_sec'] = worker['replications'] / worker['seconds'] if worker['seconds'] else np.inf
+
+    return {
+        'stats': stats,
+        'workers': workers,
+        'elapsed': elapsed,
+        'replications_per_sec': num_replications / elapsed if elapsed else np.inf
+    }
@@ -0,0 +1,167 @@
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+
+''' On-disk cache of scenario results
+
+Each entry is one JSON file named by the SHA-256 of the model name, its
+parameters, the seed and the code version (a hash of the model's source
+files), so a changed parameter, seed or model file never returns a stale
+result. Reading an entry refreshes its modification time, and after every
+write the least recently used entries are deleted until the cache is at
+most max_bytes.
+
+'''
+
+default_cache_dir = '.result_cache'
+default_max_bytes = 64 * 2**20
+
+
+@functools.lru_cache(maxsize=None)
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def code_version(*objects):
+    """
+    Hash of the source files of the modules defining the given functions,
+    classes or modules.
+    """
+    paths = []
+    for obj in objects:
+        module = obj if isinstance(obj, type(sys)) else sys.modules[obj.__module__]
+        paths.append(os.path.abspath(module.__file__))
+    digest = hashlib.sha256()
+    for path in sorted(set(paths)):
+        digest.update(_file_hash(path).encode())
+    return digest.hexdigest()
+
+
+def _encode(value):
+    # JSON form of results: numpy values become Python values, dataclasses
+    # become dicts and dicts with non-string keys become item lists
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return _encode(dataclasses.asdict(value))
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: _encode(v) for k, v in value.items()}
+        return {"__items__": [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {"__items__"}:
+            return {_key(k): _decode(v) for k, v in value["__items__"]}
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _key(k):
+    # Dict keys must be hashable again after decoding
+    return tuple(_key(x) for x in k) if isinstance(k, list) else k
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of JSON-serializable results in cache_dir.
+    """
+
+    def __init__(self, cache_dir=default_cache_dir, max_bytes=default_max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model, params, seed, version):
+        """Content hash of a scenario."""
+        source = json.dumps([model, _encode(params), seed, version], sort_keys=True)
+        return hashlib.sha256(source.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Cached result for key, or None."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = _decode(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # Write to a temporary file first so a crash never leaves a partial entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(_encode(value), f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits max_bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def cached(self, model, params, seed, version, compute):
+        """
+        Result of compute() for the scenario, from the cache if present.
+
+        Returns:
+        - (result, True if it came from the cache)
+        """
+        if seed is None:
+            raise ValueError("only seeded runs can be cached (seed=None)")
+        key = self.key(model, params, seed, version)
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        value = compute()
+        self.put(key, value)
+        return _decode(_encode(value)), False
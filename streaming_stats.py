@@ -0,0 +1,306 @@
+from statistics import NormalDist
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded memory (KLL-style compactors).
+
+    Level h holds items that each stand for 2**h observations. When a level
+    grows beyond k items it is sorted and every other item is promoted to
+    the next level, so memory stays O(k log(n / k)). The offset of the
+    promoted items is drawn from rng, or alternates between compactions of
+    a level when rng is None, so the sketch is reproducible either way.
+    """
+
+    def __init__(self, k=200, rng=None):
+        self.k = k
+        self.rng = rng
+        self.levels = [np.empty(0)]
+        # Offset of the next compaction of each level (without rng)
+        self._offsets = [0]
+        self.count = 0
+        self._buffer = []
+
+    def update(self, x):
+        # Buffer scalars and add them in blocks
+        self._buffer.append(x)
+        if len(self._buffer) >= self.k:
+            self._flush()
+
+    def update_many(self, values):
+        self._flush()
+        values = np.asarray(values, dtype=float).ravel()
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other):
+        """Adds the observations summarized by another sketch."""
+        self._flush()
+        other._flush()
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+            self._offsets.append(0)
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate((self.levels[h], items))
+        self.count += other.count
+        self._compress()
+
+    def sorted_items(self):
+        """
+        Retained items in ascending order with their cumulative weight
+        fractions, i.e. the approximate empirical CDF at each item.
+        """
+        self._flush()
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_h), 2.0 ** h) for h, items_h in enumerate(self.levels)])
+        order = np.argsort(items)
+        cum_weights = np.cumsum(weights[order])
+        return items[order], cum_weights / cum_weights[-1] if len(items) else cum_weights
+
+    def quantile(self, q):
+        """Approximate q-quantile (q may be a scalar or an array)."""
+        items, cum_fraction = self.sorted_items()
+        if len(items) == 0:
+            return np.nan
+        idx = np.searchsorted(cum_fraction, q)
+        return items[np.minimum(idx, len(items) - 1)]
+
+    def cdf(self, x):
+        """Approximate fraction of observations <= x (x may be an array)."""
+        items, cum_fraction = self.sorted_items()
+        idx = np.searchsorted(items, x, side='right')
+        return np.where(idx > 0, cum_fraction[np.maximum(idx - 1, 0)], 0.0)
+
+    def _flush(self):
+        if self._buffer:
+            values = self._buffer
+            self._buffer = []
+            self.update_many(values)
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # Keep one item back when the level has odd length
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[:len(items) - len(keep)]
+                promoted = pairs[self._offset(h)::2]
+                self.levels[h] = keep
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                    self._offsets.append(0)
+                self.levels[h + 1] = np.concatenate((self.levels[h + 1], promoted))
+            h += 1
+
+    def _offset(self, h):
+        if self.rng is not None:
+            return int(self.rng.integers(2))
+        offset = self._offsets[h]
+        self._offsets[h] = 1 - offset
+        return offset
+
+
+class StreamingStats:
+    """
+    O(1)-memory accumulator for a stream of observations.
+
+    Tracks the mean and variance (Welford / Chan et al. merge), a fixed
+    number of batch means whose batch size doubles as the stream grows, and
+    optionally a quantile sketch (whose compactions draw from rng, see
+    QuantileSketch). Observations can be added one at a time with update()
+    or as arrays with update_many().
+    """
+
+    def __init__(self, num_batches=32, quantile_k=200, rng=None):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+        # Batch means: at most 2 * num_batches batches of batch_size observations
+        self.num_batches = num_batches
+        self.batch_size = 1
+        self._batch_means = np.empty(0)
+        self._partial_sum = 0.0
+        self._partial_n = 0
+
+        self.sketch = QuantileSketch(quantile_k, rng) if quantile_k else None
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+        self._partial_sum += x
+        self._partial_n += 1
+        if self._partial_n == self.batch_size:
+            batch_mean = self._partial_sum / self.batch_size
+            self._partial_sum = 0.0
+            self._partial_n = 0
+            self._add_batches(np.array([batch_mean]))
+
+        if self.sketch is not None:
+            self.sketch.update(x)
+
+    def update_many(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        m = len(values)
+        if m == 0:
+            return
+
+        # Merge the block's mean and variance
+        block_mean = values.mean()
+        block_m2 = ((values - block_mean) ** 2).sum()
+        n = self.count + m
+        delta = block_mean - self.mean
+        self.mean += delta * m / n
+        self._m2 += block_m2 + delta ** 2 * self.count * m / n
+        self.count = n
+
+        # Complete the partial batch, then add whole batches at once
+        need = self.batch_size - self._partial_n
+        if m < need:
+            self._partial_sum += values.sum()
+            self._partial_n += m
+        else:
+            size = self.batch_size
+            first = (self._partial_sum + values[:need].sum()) / size
+            rest = values[need:]
+            whole = len(rest) // size
+            full = rest[:whole * size].reshape(whole, size).mean(axis=1)
+            self._partial_sum = 0.0
+            self._partial_n = 0
+            self._add_batches(np.concatenate(([first], full)))
+            # Leftover observations (fewer than one old batch) follow in time
+            tail = rest[whole * size:]
+            self._partial_sum += tail.sum()
+            self._partial_n += len(tail)
+
+        if self.sketch is not None:
+            self.sketch.update_many(values)
+
+    def merge(self, other):
+        """
+        Adds the statistics of another accumulator, whose observations are
+        taken to follow this stream's. The mean, variance and quantiles are
+        merged exactly. Batch means are brought to a common batch size and
+        the other stream's are appended; the two partial batches are pooled.
+        """
+        if other.count == 0:
+            return
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / n
+        self.count = n
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+
+        size = max(self.batch_size, other.batch_size)
+        self._batch_means, self._partial_sum, self._partial_n = _rebatch(
+            self._batch_means, self.batch_size, size, self._partial_sum, self._partial_n)
+        self.batch_size = size
+        means, partial_sum, partial_n = _rebatch(
+            other._batch_means, other.batch_size, size, other._partial_sum, other._partial_n)
+        self._partial_sum += partial_sum
+        self._partial_n += partial_n
+        if self._partial_n >= size:
+            # The pooled partial batch fills one batch; the rest stays partial
+            partial_mean = self._partial_sum / self._partial_n
+            means = np.concatenate((means, [partial_mean]))
+            self._partial_n -= size
+            self._partial_sum = partial_mean * self._partial_n
+        self._add_batches(means)
+
+    def variance(self, ddof=1):
+        if self.count - ddof <= 0:
+            return np.nan
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.variance(ddof))
+
+    @property
+    def batch_means(self):
+        return self._batch_means
+
+    def quantile(self, q):
+        if self.sketch is None:
+            raise ValueError("quantiles are disabled for this accumulator (quantile_k=None)")
+        return self.sketch.quantile(q)
+
+    def half_width(self, confidence=0.95, method="batch"):
+        """
+        Half-width of the confidence interval for the mean.
+
+        method="batch" uses the batch means (valid for autocorrelated output
+        such as successive tankers); method="iid" uses the sample variance.
+        """
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        if method == "batch":
+            if len(self._batch_means) < 2:
+                return np.inf
+            return z * self._batch_means.std(ddof=1) / np.sqrt(len(self._batch_means))
+        if self.count < 2:
+            return np.inf
+        return z * np.sqrt(self.variance() / self.count)
+
+    def _add_batches(self, means):
+        self._batch_means = np.concatenate((self._batch_means, means))
+        # Halve the number of batches by merging neighbours when over capacity
+        while len(self._batch_means) > 2 * self.num_batches:
+            if len(self._batch_means) % 2:
+                # The unpaired last batch goes back into the partial batch
+                self._partial_sum += self._batch_means[-1] * self.batch_size
+                self._partial_n += self.batch_size
+                self._batch_means = self._batch_means[:-1]
+            self._batch_means = (self._batch_means[0::2] + self._batch_means[1::2]) / 2
+            self.batch_size *= 2
+
+
+def _rebatch(means, size, target, partial_sum, partial_n):
+    # Merge neighbouring batch means until batches hold target observations;
+    # an unpaired last batch goes back into the partial batch
+    while size < target:
+        if len(means) % 2:
+            partial_sum += means[-1] * size
+            partial_n += size
+            means = means[:-1]
+        means = (means[0::2] + means[1::2]) / 2
+        size *= 2
+    return means, partial_sum, partial_n
+
+
+def run_until_precision(draw, target_half_width, relative=False, confidence=0.95,
+                        method="batch", min_count=1000, max_count=None, stats=None):
+    """
+    Sequential stopping rule: keeps adding observations until the confidence
+    interval half-width of the mean is at most target_half_width.
+
+    Parameters:
+    - draw: callable returning the next block of observations (array or list)
+    - target_half_width: required half-width (a fraction of |mean| if relative)
+    - confidence: confidence level of the interval
+    - method: "batch" (batch means) or "iid", see StreamingStats.half_width
+    - min_count: observations required before the rule is checked
+    - max_count: hard limit on the number of observations (None for no limit)
+    - stats: accumulator to continue (default: a new StreamingStats)
+
+    Returns:
+    - The StreamingStats accumulator
+    """
+    if stats is None:
+        stats = StreamingStats()
+    while True:
+        stats.update_many(draw())
+        if stats.count >= min_count:
+            target = target_half_width * abs(stats.mean) if relative else target_half_width
+            if stats.half_width(confidence, method) <= target:
+                break
+        if max_count is not None and stats.count >= max_count:
+            break
+    return stats
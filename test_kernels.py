@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import heart_specialist
+import kernels
+import port_engine
+from heart_specialist import ClinicConfig, _simulate_block
+
+''' The compiled kernels against the NumPy/heap implementations
+
+Each check runs the same draws through the compiled kernel, its uncompiled
+Python version (.py_func) and the model's own implementation.
+
+'''
+
+clinic_configs = [
+    ClinicConfig(),
+    ClinicConfig(patients_per_day=24, service_time_scheduled=25)
+]
+
+# Twelve terminals with unload times varying by terminal and size
+many_terminals = tuple(f"T{k}" for k in range(12))
+many_unload_times = {
+    size: {t: 10 + 3 * k + offset for k, t in enumerate(many_terminals)}
+    for size, offset in (("supertanker", 8), ("midsize", 4), ("small", 0))
+}
+
+# Arrivals fast enough that tankers queue for a terminal
+port_cases = [
+    {"iat_values": (1, 2), "iat_cum_probs": (0.6, 1.0)},
+    {"terminals": many_terminals, "unload_times": many_unload_times,
+     "iat_values": (1, 2, 3), "iat_cum_probs": (0.5, 0.8, 1.0)}
+]
+
+
+def _clinic_block(monkeypatch, config, recursion):
+    # One block of clinic days; recursion None is the NumPy recursion
+    if recursion is None:
+        monkeypatch.setattr(heart_specialist, "HAVE_NUMBA", False)
+    else:
+        monkeypatch.setattr(heart_specialist, "HAVE_NUMBA", True)
+        monkeypatch.setattr(heart_specialist, "clinic_recursion", recursion)
+    rng = np.random.default_rng(2024)
+    return _simulate_block(500, rng, config, config.patients_per_day)
+
+
+@pytest.mark.parametrize("config", clinic_configs)
+def test_clinic_recursion_matches_numpy(monkeypatch, config):
+    expected = _clinic_block(monkeypatch, config, None)
+    for recursion in (kernels.clinic_recursion.py_func, kernels.clinic_recursion):
+        result = _clinic_block(monkeypatch, config, recursion)
+        for got, want in zip(result, expected):
+            np.testing.assert_array_equal(got, want)
+
+
+def _port_run(case, use_kernel):
+    rng = np.random.default_rng(7)
+    # Small blocks so the kernel chains next_free across calls
+    return port_engine.simulate_port(5000, rng=rng, chunk_size=1000, use_kernel=use_kernel, **case)
+
+
+@pytest.mark.parametrize("case", port_cases, ids=["2 terminals", "12 terminals"])
+def test_dispatch_tankers_matches_heap(monkeypatch, case):
+    expected = _port_run(case, False)
+    results = [_port_run(case, True)]
+    monkeypatch.setattr(port_engine, "dispatch_tankers", kernels.dispatch_tankers.py_func)
+    results.append(_port_run(case, True))
+
+    # Every terminal is used and some tankers wait
+    assert len(np.unique(expected["terminal"])) == len(expected["terminals"])
+    assert (expected["start"] > expected["arrival"]).any()
+    for result in results:
+        for field in ("arrival", "start", "departure", "terminal", "size"):
+            np.testing.assert_array_equal(result[field], expected[field])
@@ -1,8 +1,8 @@
-import numpy as np
-import matplotlib.pyplot as plt
+import argparse
 import time
+import numpy as np
 
-np.random.seed(4521)  # Set seed for reproducibility
+import profiling
 
 def triangular_pdf(x, a, c, b):
     """
@@ -18,35 +18,42 @@ def triangular_pdf(x, a, c, b):
     else:  # c < x <= b
         return 2 * (b - x) / ((b - a) * (b - c))
 
-def theoretical_acceptance_probability(a, c, b):
+def theoretical_acceptance_probability(a, c, b, num_segments=None):
     """
     Calculate the theoretical acceptance probability for the acceptance-rejection method
     on a triangular distribution with parameters a, c, b.
     
     The acceptance probability equals the ratio of the area under the PDF to 
-    the area of the enclosing rectangle.
+    the area of the enclosing rectangle. With num_segments, the envelope is
+    the step envelope used by squeeze_rejection_triangular instead.
     """
-    # Maximum height of the PDF (at mode c)
-    max_pdf = triangular_pdf(c, a, c, b)
+    # Maximum height of the PDF (at mode c; also defined when c == a or c == b)
+    max_pdf = 2 / (b - a)
     
     # Area under the PDF is always 1 for a proper PDF
     pdf_area = 1.0
     
     # Area of the enclosing rectangle: width * height
     rectangle_area = (b - a) * max_pdf
+    if num_segments is not None:
+        edges, _, upper = step_envelope(a, c, b, num_segments)
+        rectangle_area = np.sum(upper * np.diff(edges))
     
     # Acceptance probability is the ratio
     acceptance_prob = pdf_area / rectangle_area
     
     return acceptance_prob
 
-def acceptance_rejection_triangular(a, c, b, n):
+def acceptance_rejection_triangular(a, c, b, n, rng=None):
     """
     Generate n random variates from a triangular distribution using acceptance-rejection method
+    (rng: numpy Generator; the legacy global RNG is used when None)
     """
+    uniform = np.random.uniform if rng is None else rng.uniform
+
     # Find the maximum value of the PDF to set up the envelope
     # For triangular distribution, maximum is at the mode c
-    max_pdf = triangular_pdf(c, a, c, b)
+    max_pdf = 2 / (b - a)
     
     # Initialize list to store generated values
     samples = []
@@ -58,10 +65,10 @@ def acceptance_rejection_triangular(a, c, b, n):
     # Continue until we have n samples
     while accepted < n:
         # Generate a uniform random number between a and b
-        x = np.random.uniform(a, b)
+        x = uniform(a, b)
         
         # Generate another uniform random number between 0 and max_pdf
-        u = np.random.uniform(0, max_pdf)
+        u = uniform(0, max_pdf)
         
         # Check if we accept this sample
         if u <= triangular_pdf(x, a, c, b):
@@ -73,91 +80,289 @@ def acceptance_rejection_triangular(a, c, b, n):
     acceptance_rate = accepted / attempts
     return np.array(samples), acceptance_rate
 
+def triangular_pdf_array(x, a, c, b):
+    """
+    Vectorized triangular_pdf: evaluates the PDF for an array of x values.
+    """
+    x = np.asarray(x, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        left = 2 * (x - a) / ((b - a) * (c - a))
+        right = 2 * (b - x) / ((b - a) * (b - c))
+    # At the mode use the peak height, which stays defined when c == a or c == b
+    pdf = np.where(x < c, left, np.where(x > c, right, 2 / (b - a)))
+    return np.where((x < a) | (x > b), 0.0, pdf)
+
+def acceptance_rejection_triangular_batch(a, c, b, n, rng=None, max_block=2**22):
+    """
+    Batched acceptance-rejection: draws blocks of candidates sized from the
+    expected acceptance rate (plus a margin), accepts them with the vectorized
+    PDF and tops up with further blocks until n variates are accepted.
+    Returns the samples and the empirical acceptance rate, like
+    acceptance_rejection_triangular.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # Peak height at the mode, defined also when c == a or c == b
+    max_pdf = 2 / (b - a)
+    expected_rate = theoretical_acceptance_probability(a, c, b)
+
+    samples = np.empty(n)
+    accepted = 0
+    attempts = 0
+    while accepted < n:
+        # Oversize the block so that usually one pass is enough
+        needed = n - accepted
+        block = min(max_block, int(needed / expected_rate * 1.05) + 64)
+        x = rng.uniform(a, b, block)
+        u = rng.uniform(0, max_pdf, block)
+        accept = u <= triangular_pdf_array(x, a, c, b)
+        keep = x[accept]
+
+        # Count attempts only up to the candidate that completed the sample
+        if len(keep) > needed:
+            attempts += np.flatnonzero(accept)[needed - 1] + 1
+            keep = keep[:needed]
+        else:
+            attempts += block
+        samples[accepted:accepted + len(keep)] = keep
+        accepted += len(keep)
+
+    return samples, accepted / attempts
+
+def inverse_transform_triangular(a, c, b, n, rng=None):
+    """
+    Generate n triangular random variates by inverting the CDF in closed form
+    (one uniform per variate, nothing rejected).
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    u = rng.random(n)
+    fc = (c - a) / (b - a)  # CDF at the mode
+    return np.where(u < fc,
+                    a + np.sqrt(u * (b - a) * (c - a)),
+                    b - np.sqrt((1 - u) * (b - a) * (b - c)))
+
+def step_envelope(a, c, b, num_segments=16):
+    """
+    Step envelope and squeeze for the triangular PDF.
+
+    [a, b] is cut into about num_segments equal pieces, with the mode c as a
+    breakpoint so the PDF is monotone on every piece. On each piece the
+    envelope is the larger and the squeeze the smaller endpoint value of
+    the PDF. Returns (edges, squeeze heights, envelope heights).
+    """
+    edges = np.union1d(np.linspace(a, b, num_segments + 1), [c])
+    pdf_at_edges = triangular_pdf_array(edges, a, c, b)
+    lower = np.minimum(pdf_at_edges[:-1], pdf_at_edges[1:])
+    upper = np.maximum(pdf_at_edges[:-1], pdf_at_edges[1:])
+    return edges, lower, upper
+
+def squeeze_rejection_triangular(a, c, b, n, num_segments=16, rng=None, max_block=2**22):
+    """
+    Acceptance-rejection with a step envelope and squeeze test.
+
+    A candidate picks an envelope piece in proportion to its area, then a
+    point uniformly under the envelope on that piece. Points under the
+    squeeze are accepted without evaluating the PDF; only the remainder is
+    checked against triangular_pdf_array. The acceptance probability is
+    1 / envelope area, which tends to 1 as num_segments grows.
+
+    Returns the samples, the empirical acceptance rate and the fraction of
+    candidates for which the PDF had to be evaluated.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    edges, lower, upper = step_envelope(a, c, b, num_segments)
+    widths = np.diff(edges)
+    areas = upper * widths
+    cum_areas = np.cumsum(areas) / areas.sum()
+    cum_areas[-1] = 1.0
+    expected_rate = 1 / areas.sum()
+
+    samples = np.empty(n)
+    accepted = 0
+    attempts = 0
+    pdf_evaluations = 0
+    while accepted < n:
+        needed = n - accepted
+        block = min(max_block, int(needed / expected_rate * 1.05) + 64)
+
+        # Candidate points under the envelope
+        segment = np.searchsorted(cum_areas, rng.random(block))
+        x = edges[segment] + widths[segment] * rng.random(block)
+        u = upper[segment] * rng.random(block)
+
+        # Squeeze test first, full PDF only for points above the squeeze
+        accept = u <= lower[segment]
+        check = np.flatnonzero(~accept)
+        accept[check] = u[check] <= triangular_pdf_array(x[check], a, c, b)
+        keep = x[accept]
+
+        # Count attempts only up to the candidate that completed the sample
+        if len(keep) > needed:
+            used = np.flatnonzero(accept)[needed - 1] + 1
+            keep = keep[:needed]
+        else:
+            used = block
+        attempts += used
+        pdf_evaluations += np.count_nonzero(check < used)
+        samples[accepted:accepted + len(keep)] = keep
+        accepted += len(keep)
+
+    return samples, accepted / attempts, pdf_evaluations / attempts
+
 # Parameters for the triangular distribution
 a = 10  # minimum
 c = 30  # most likely
 b = 40  # maximum
 n = 500  # number of samples to generate
+seed = 4521  # For reproducibility
+num_segments = 16  # step envelope pieces for the squeeze sampler
+
+def print_report(a, c, b, n, num_segments=num_segments, rng=None, seed=seed):
+    """
+    Samples n variates by acceptance-rejection (legacy global RNG, or the
+    batched sampler with rng) and prints their statistics against the
+    theory, then compares the step-envelope sampler with squeeze (drawing
+    from rng, or a Generator seeded with seed).
+
+    Returns:
+    - (samples, empirical acceptance rate)
+    """
+    # Calculate theoretical acceptance probability
+    theoretical_prob = theoretical_acceptance_probability(a, c, b)
+
+    # Measure execution time
+    start_time = time.time()
+
+    # Generate the random variates
+    with profiling.phase("simulate"):
+        if rng is None:
+            samples, empirical_prob = acceptance_rejection_triangular(a, c, b, n)
+        else:
+            samples, empirical_prob = acceptance_rejection_triangular_batch(a, c, b, n, rng)
+    profiling.count("samples", n)
+    execution_time = time.time() - start_time
+
+    # Print statistics
+    print(f"Generated {n} triangular random variates")
+    print(f"Parameters: min={a}, mode={c}, max={b}")
+    print(f"Empirical acceptance rate: {empirical_prob:.4f}")
+    print(f"Theoretical acceptance probability: {theoretical_prob:.4f}")
+    print(f"Ratio (empirical/theoretical): {empirical_prob/theoretical_prob:.4f}")
+    print(f"Execution time: {execution_time:.4f} seconds")
+    print(f"Sample mean: {np.mean(samples):.4f}")
+    print(f"Sample variance: {np.var(samples, ddof=1):.4f}")
+    print(f"Theoretical mean: {(a + b + c)/3:.4f}")
+    print(f"Theoretical variance: {(a**2 + b**2 + c**2 - a*b - a*c - b*c)/18:.4f}")
+    emp_var = np.var(samples, ddof=1)
+    th_var = (a**2 + b**2 + c**2 - a*b - a*c - b*c) / 18
+    print(f"Variance error: {emp_var - th_var:.4g}")
+    print(f"Variance error (%): {(emp_var/th_var - 1)*100:.2f}%")
+
+    # Compare with the step-envelope sampler with squeeze
+    squeeze_rng = np.random.default_rng(seed) if rng is None else rng
+    with profiling.phase("simulate"):
+        _, squeeze_prob, pdf_eval_rate = squeeze_rejection_triangular(a, c, b, n, num_segments,
+                                                                      rng=squeeze_rng)
+    profiling.count("samples", n)
+    print(f"\nStep envelope with squeeze ({num_segments} segments):")
+    print(f"Empirical acceptance rate: {squeeze_prob:.4f}")
+    print(f"Theoretical acceptance probability: {theoretical_acceptance_probability(a, c, b, num_segments):.4f}")
+    print(f"Candidates needing a PDF evaluation: {pdf_eval_rate:.4f}")
+
+    return samples, empirical_prob
+
+def plot_report(samples, a, c, b, output=None):
+    """
+    Histogram of the samples against the PDF, the acceptance-rejection
+    regions and the convergence of the acceptance rate. With output (a .png
+    or .svg path) the figure is rendered headless and saved there instead
+    of shown.
+    """
+    from plotting import finish_figure, new_figure, plot_histogram
+
+    theoretical_prob = theoretical_acceptance_probability(a, c, b)
+
+    # Visualize the results
+    fig = new_figure((12, 8), output)
+
+    # Plot 1: Histogram of generated samples (binned in chunks)
+    ax = fig.add_subplot(2, 2, 1)
+    plot_histogram(ax, samples, bins=30, density=True, alpha=0.7, color='skyblue')
+    ax.set_title('Histogram of Generated Triangular Random Variates')
+    ax.set_xlabel('Value')
+    ax.set_ylabel('Density')
+
+    # Plot theoretical PDF for comparison
+    x = np.linspace(a, b, 1000)
+    y = triangular_pdf_array(x, a, c, b)
+    ax.plot(x, y, 'r-', lw=2, label='Theoretical PDF')
+    ax.legend()
+
+    # Plot 2: Visualization of acceptance-rejection method
+    ax = fig.add_subplot(2, 2, 2)
+    # Same grid and PDF values as plot 1
+    x_grid, y_pdf = x, y
+    max_pdf = 2 / (b - a)
+
+    # Plot PDF
+    ax.plot(x_grid, y_pdf, 'b-', lw=2, label='PDF')
+    # Plot envelope (rectangle)
+    ax.plot([a, a, b, b, a], [0, max_pdf, max_pdf, 0, 0], 'r--', lw=1.5, label='Envelope')
+    # Fill the area under the PDF
+    ax.fill_between(x_grid, y_pdf, alpha=0.3, color='blue', label='Acceptance Region')
+    # Fill the rejection region
+    ax.fill_between(x_grid, y_pdf, max_pdf, where=(y_pdf < max_pdf), alpha=0.3, color='red', label='Rejection Region')
+
+    ax.set_title('Acceptance-Rejection Method Visualization')
+    ax.set_xlabel('x')
+    ax.set_ylabel('Density')
+    ax.legend()
+
+    # Plot 3: Acceptance rate convergence
+    ax = fig.add_subplot(2, 2, 3)
+    # Run a small simulation to show convergence of acceptance rate
+    acceptance_rates = []
+    sample_sizes = [10, 50, 100, 200, 300, 400, 500, 750, 1000]
+    for size in sample_sizes:
+        _, rate = acceptance_rejection_triangular(a, c, b, size)
+        acceptance_rates.append(rate)
+
+    ax.plot(sample_sizes, acceptance_rates, 'bo-', label='Empirical Rate')
+    ax.axhline(y=theoretical_prob, color='r', linestyle='--', label=f'Theoretical: {theoretical_prob:.4f}')
+    ax.set_title('Acceptance Rate Convergence')
+    ax.set_xlabel('Sample Size')
+    ax.set_ylabel('Acceptance Rate')
+    ax.legend()
+
+    finish_figure(fig, output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Triangular random variates by acceptance-rejection.")
+    parser.add_argument('--min', dest='a', type=float, default=a)
+    parser.add_argument('--mode', dest='c', type=float, default=c)
+    parser.add_argument('--max', dest='b', type=float, default=b)
+    parser.add_argument('-n', type=int, default=n, help="number of samples")
+    parser.add_argument('--seed', type=int, default=seed)
+    parser.add_argument('--segments', type=int, default=num_segments,
+                        help="step envelope pieces for the squeeze sampler")
+    parser.add_argument('--batch', action='store_true',
+                        help="sample with the batched sampler (for large n)")
+    parser.add_argument('--no-plot', action='store_true', help="skip the plots")
+    parser.add_argument('--output', help="save the plots to this file (.png, .svg) instead of showing them")
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    np.random.seed(args.seed)
+    rng = np.random.default_rng(args.seed) if args.batch else None
+    with profiling.session(args.profile, args.profile_output):
+        samples, _ = print_report(args.a, args.c, args.b, args.n, args.segments, rng, args.seed)
+        if not args.no_plot:
+            with profiling.phase("report"):
+                plot_report(samples, args.a, args.c, args.b, args.output)
 
-# Calculate theoretical acceptance probability
-theoretical_prob = theoretical_acceptance_probability(a, c, b)
-
-# Measure execution time
-start_time = time.time()
-
-# Generate the random variates
-samples, empirical_prob = acceptance_rejection_triangular(a, c, b, n)
-execution_time = time.time() - start_time
-
-# Print statistics
-print(f"Generated {n} triangular random variates")
-print(f"Parameters: min={a}, mode={c}, max={b}")
-print(f"Empirical acceptance rate: {empirical_prob:.4f}")
-print(f"Theoretical acceptance probability: {theoretical_prob:.4f}")
-print(f"Ratio (empirical/theoretical): {empirical_prob/theoretical_prob:.4f}")
-print(f"Execution time: {execution_time:.4f} seconds")
-print(f"Sample mean: {np.mean(samples):.4f}")
-print(f"Sample variance: {np.var(samples, ddof=1):.4f}")
-print(f"Theoretical mean: {(a + b + c)/3:.4f}")
-print(f"Theoretical variance: {(a**2 + b**2 + c**2 - a*b - a*c - b*c)/18:.4f}")
-emp_var = np.var(samples, ddof=1)
-th_var = (a**2 + b**2 + c**2 - a*b - a*c - b*c) / 18
-print(f"Variance error: {emp_var - th_var:.4g}")
-print(f"Variance error (%): {(emp_var/th_var - 1)*100:.2f}%")
-
-
-# Visualize the results
-plt.figure(figsize=(12, 8))
-
-# Plot 1: Histogram of generated samples
-plt.subplot(2, 2, 1)
-plt.hist(samples, bins=30, density=True, alpha=0.7, color='skyblue')
-plt.title('Histogram of Generated Triangular Random Variates')
-plt.xlabel('Value')
-plt.ylabel('Density')
-
-# Plot theoretical PDF for comparison
-x = np.linspace(a, b, 1000)
-y = [triangular_pdf(val, a, c, b) for val in x]
-plt.plot(x, y, 'r-', lw=2, label='Theoretical PDF')
-plt.legend()
-
-# Plot 2: Visualization of acceptance-rejection method
-plt.subplot(2, 2, 2)
-# Create a dense grid of x values for plotting
-x_grid = np.linspace(a, b, 1000)
-y_pdf = np.array([triangular_pdf(x, a, c, b) for x in x_grid])
-max_pdf = triangular_pdf(c, a, c, b)
-
-# Plot PDF
-plt.plot(x_grid, y_pdf, 'b-', lw=2, label='PDF')
-# Plot envelope (rectangle)
-plt.plot([a, a, b, b, a], [0, max_pdf, max_pdf, 0, 0], 'r--', lw=1.5, label='Envelope')
-# Fill the area under the PDF
-plt.fill_between(x_grid, y_pdf, alpha=0.3, color='blue', label='Acceptance Region')
-# Fill the rejection region
-plt.fill_between(x_grid, y_pdf, max_pdf, where=(y_pdf < max_pdf), alpha=0.3, color='red', label='Rejection Region')
-
-plt.title('Acceptance-Rejection Method Visualization')
-plt.xlabel('x')
-plt.ylabel('Density')
-plt.legend()
-
-# Plot 3: Acceptance rate convergence
-plt.subplot(2, 2, 3)
-# Run a small simulation to show convergence of acceptance rate
-acceptance_rates = []
-sample_sizes = [10, 50, 100, 200, 300, 400, 500, 750, 1000]
-for size in sample_sizes:
-    _, rate = acceptance_rejection_triangular(a, c, b, size)
-    acceptance_rates.append(rate)
-
-plt.plot(sample_sizes, acceptance_rates, 'bo-', label='Empirical Rate')
-plt.axhline(y=theoretical_prob, color='r', linestyle='--', label=f'Theoretical: {theoretical_prob:.4f}')
-plt.title('Acceptance Rate Convergence')
-plt.xlabel('Sample Size')
-plt.ylabel('Acceptance Rate')
-plt.legend()
-
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()